@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+bench.py — speed benchmarks for the FCD analysis and the replication runner.
+
+Three groups, all offline (SUMO and this repo only):
+
+  fcd   synthetic FCD traces at scaled sizes (vehicles/step × timesteps ×
+        lanes) — times parse_fcd, calculate_ttc and calculate_ssm_2d (the
+        reference loops) and the streaming fcd_stream pass
+  e2e   one replication of `run delay final.py` on a built-in straight
+        two-lane road (netconvert + flows, no trip files), reported as
+        simulated seconds per wall second
+  all   both (default)
+
+Results are written as JSON; pass an earlier file as --baseline to flag
+every benchmark that got slower than the baseline by more than --threshold
+(exit status 1 if any did).
+
+    python bench.py --save bench_baseline.json
+    python bench.py --baseline bench_baseline.json --threshold 0.2
+"""
+
+import os, sys, json, time, random, argparse, platform, tempfile, subprocess
+import importlib.util
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+# vehicles per step, timesteps, lanes
+SIZES = {"tiny":   (20,   100, 2),
+         "small":  (50,   500, 3),
+         "medium": (150, 1000, 4),
+         "large":  (400, 3600, 6)}
+
+# ---------------------------------------------------------------------------
+# Synthetic FCD
+# ---------------------------------------------------------------------------
+def synthetic_fcd(path, vehicles, steps, lanes, step_length=0.1, seed=0):
+    """Write an fcd-export with `vehicles` cars spread over `lanes` parallel
+    lanes of a 1 km ring, each moving at its own speed, for `steps` steps."""
+    rng   = random.Random(seed)
+    x     = [rng.uniform(0, 1000) for _ in range(vehicles)]
+    lane  = [rng.randrange(lanes) for _ in range(vehicles)]
+    speed = [rng.uniform(5, 25) for _ in range(vehicles)]
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<fcd-export>\n')
+        for k in range(steps):
+            f.write(f'    <timestep time="{k * step_length:.2f}">\n')
+            for i in range(vehicles):
+                speed[i] = min(30.0, max(0.0, speed[i] + rng.gauss(0, 0.3)))
+                x[i] = (x[i] + speed[i] * step_length) % 1000
+                f.write(f'        <vehicle id="veh{i}" x="{x[i]:.2f}" '
+                        f'y="{-3.2 * lane[i]:.2f}" angle="90.00" type="DEFAULT_VEHTYPE" '
+                        f'speed="{speed[i]:.2f}" pos="{x[i]:.2f}" lane="ring_{lane[i]}" '
+                        f'slope="0.00"/>\n')
+            f.write('    </timestep>\n')
+        f.write('</fcd-export>\n')
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_fcd(sizes, repeat, workdir):
+    import calc_mean_ttc, calc_mean_ssm_2d, fcd_stream
+    out = {}
+    for name in sizes:
+        v, s, l = SIZES[name]
+        path = os.path.join(workdir, f"fcd_{name}.xml")
+        synthetic_fcd(path, v, s, l)
+        traj = calc_mean_ttc.parse_fcd(path)
+        size = {"vehicles": v, "steps": s, "lanes": l}
+        runs = {
+            "parse_fcd":        lambda: calc_mean_ttc.parse_fcd(path),
+            "calculate_ttc":    lambda: calc_mean_ttc.calculate_ttc(traj),
+            "calculate_ssm_2d": lambda: calc_mean_ssm_2d.calculate_ssm_2d(
+                                    traj, **calc_mean_ssm_2d.ssm_params()),
+            "stream_ttc_ssm":   lambda: fcd_stream.run_metrics(path, [
+                                    fcd_stream.MeanTTC(),
+                                    fcd_stream.MeanSSM2D(**calc_mean_ssm_2d.ssm_params())]),
+        }
+        for fn_name, fn in runs.items():
+            sec = best_of(fn, repeat)
+            out[f"{fn_name}[{name}]"] = {"seconds": sec, **size,
+                                         "rows_per_s": v * s / sec}
+            print(f"  {fn_name + '[' + name + ']':30s} {sec:9.3f} s "
+                  f"({v * s / sec:,.0f} vehicle-rows/s)")
+    return out
+
+# ---------------------------------------------------------------------------
+# End-to-end mini scenario
+# ---------------------------------------------------------------------------
+MINI_NODES = """<nodes>
+    <node id="a" x="0" y="0"/>
+    <node id="b" x="1500" y="0"/>
+</nodes>
+"""
+MINI_EDGES = """<edges>
+    <edge id="road" from="a" to="b" numLanes="2" speed="27.8"/>
+</edges>
+"""
+MINI_ROUTES = """<routes>
+    <vType id="car" speedDev="0.15"/>
+    <vType id="CAV" speedDev="0.05" color="0,0,1"/>
+    <route id="r" edges="road"/>
+    <flow id="cars" type="car" route="r" begin="0" end="{end}" vehsPerHour="1800"
+          departLane="random" departSpeed="max"/>
+    <flow id="cavs" type="CAV" route="r" begin="0" end="{end}" vehsPerHour="1200"
+          departLane="random" departSpeed="max"/>
+</routes>
+"""
+MINI_CFG = """<configuration>
+    <input>
+        <net-file value="mini.net.xml"/>
+        <route-files value="mini.rou.xml"/>
+    </input>
+    <time>
+        <step-length value="0.1"/>
+    </time>
+    <report>
+        <no-step-log value="true"/>
+    </report>
+</configuration>
+"""
+
+def mini_scenario(workdir, end=300):
+    """Build the mini network and config in `workdir`; returns the .sumocfg."""
+    from sumolib import checkBinary
+    files = {"mini.nod.xml": MINI_NODES, "mini.edg.xml": MINI_EDGES,
+             "mini.rou.xml": MINI_ROUTES.format(end=end), "mini.sumocfg": MINI_CFG}
+    for name, text in files.items():
+        with open(os.path.join(workdir, name), "w") as f:
+            f.write(text)
+    subprocess.run([checkBinary("netconvert"), "-n", "mini.nod.xml", "-e", "mini.edg.xml",
+                    "-o", "mini.net.xml", "--no-warnings"],
+                   cwd=workdir, check=True, stdout=subprocess.DEVNULL)
+    return os.path.join(workdir, "mini.sumocfg")
+
+
+def load_runner():
+    spec = importlib.util.spec_from_file_location(
+        "run_delay_final", os.path.join(HERE, "run delay final.py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def bench_e2e(backend, repeat, workdir, delay=0.5):
+    runner = load_runner()
+    cfg  = mini_scenario(workdir)
+    args = runner.parse_args(["--cfg", cfg, "--backend", backend,
+                              "--outputs", "metrics-only", "--outDir", workdir,
+                              "--excel", os.path.join(workdir, "bench.xlsx")])
+    sc   = next(s for s in runner.make_scenarios(args) if abs(s.comm_delay - delay) < 1e-9)
+    job  = runner.make_job(args, sc, 1)
+    best = None
+    for _ in range(repeat):
+        _, info = runner.run_replication(args, job)
+        loop = info["wall_s"] - info["startup_s"]
+        if best is None or loop < best["seconds"]:
+            best = {"seconds": loop, "startup_s": info["startup_s"],
+                    "n_steps": info["n_steps"],
+                    "sim_s_per_wall_s": info["n_steps"] * 0.1 / loop,
+                    "calls_per_step": info["traci_calls"] / max(info["n_steps"], 1)}
+    name = f"e2e_replication[{backend}]"
+    print(f"  {name:30s} {best['seconds']:9.3f} s "
+          f"({best['sim_s_per_wall_s']:.0f} sim-s per wall-s)")
+    return {name: best}
+
+# ---------------------------------------------------------------------------
+# Baselines
+# ---------------------------------------------------------------------------
+def meta():
+    import numpy
+    try:
+        from sumolib import checkBinary
+        sumo = subprocess.run([checkBinary("sumo"), "--version"], capture_output=True,
+                              text=True).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        sumo = None
+    return {"python": platform.python_version(), "numpy": numpy.__version__,
+            "sumo": sumo, "machine": platform.platform(), "cpus": os.cpu_count(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S")}
+
+
+def compare(results, baseline, threshold):
+    """Print new vs baseline seconds; returns the names that regressed."""
+    slow = []
+    print(f"\n{'benchmark':32s} {'base s':>9s} {'new s':>9s} {'ratio':>7s}")
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:32s} {'—':>9s} {r['seconds']:9.3f}")
+            continue
+        ratio = r["seconds"] / base["seconds"]
+        flag  = ratio > 1 + threshold
+        if flag:
+            slow.append(name)
+        print(f"{name:32s} {base['seconds']:9.3f} {r['seconds']:9.3f} {ratio:7.2f}"
+              + ("  ✗ REGRESSION" if flag else ""))
+    return slow
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("group",       nargs="?", choices=["fcd", "e2e", "all"], default="all")
+    ap.add_argument("--sizes",     default="small,medium",
+                                   help=f"comma-separated FCD sizes from {list(SIZES)}")
+    ap.add_argument("--backend",   choices=["traci", "libsumo"], default="traci")
+    ap.add_argument("--repeat",    type=int,   default=3,
+                                   help="runs per benchmark, the fastest counts")
+    ap.add_argument("--save",      default="bench_results.json",
+                                   help="where to write this run's results")
+    ap.add_argument("--baseline",  default=None, help="results JSON to compare with")
+    ap.add_argument("--threshold", type=float, default=0.2,
+                                   help="allowed slowdown vs the baseline (0.2 = 20 %%)")
+    args = ap.parse_args(argv)
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = set(sizes) - set(SIZES)
+    if unknown:
+        ap.error(f"unknown size(s) {sorted(unknown)}")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        if args.group in ("fcd", "all"):
+            print("FCD analysis")
+            results.update(bench_fcd(sizes, args.repeat, workdir))
+        if args.group in ("e2e", "all"):
+            print("End-to-end replication")
+            results.update(bench_e2e(args.backend, args.repeat, workdir))
+
+    with open(args.save, "w") as f:
+        json.dump({"meta": meta(), "results": results}, f, indent=2)
+    print(f"\nResults written to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            slow = compare(results, json.load(f), args.threshold)
+        if slow:
+            print(f"\n{len(slow)} benchmark(s) slower than the baseline by more than "
+                  f"{args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
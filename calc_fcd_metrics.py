@@ -0,0 +1,20 @@
+"""Mean TTC and mean 2D SSM from a single streaming pass over the FCD file.
+
+Writes the same mean_ttc.csv / mean_ssm_2d.csv as calc_mean_ttc.py and
+calc_mean_ssm_2d.py, but reads fcd.xml (or fcd.xml.gz) only once — or not at
+all when its columnar cache (fcd_cache.py) is up to date.
+"""
+import pandas as pd
+import fcd_stream, fcd_parallel
+from calc_mean_ssm_2d import ssm_params, SSM_UPPER
+
+if __name__ == "__main__":
+    fcd_file, jobs, net = fcd_parallel.cli_args(description=__doc__)
+    res = fcd_parallel.run_metrics_parallel(fcd_file, [fcd_stream.MeanTTC(ttc_upper=5, net=net),
+                                                       fcd_stream.MeanSSM2D(net=net, **ssm_params())],
+                                            jobs, lanes=net.codes() if net else None)
+
+    pd.DataFrame([{"mean_ttc": res["mean_ttc"]}]).to_csv("mean_ttc.csv", index=False)
+    pd.DataFrame([{"mean_ssm_2d": res["mean_ssm_2d"]}]).to_csv("mean_ssm_2d.csv", index=False)
+    print(f"Mean TTC (TTC ≤ 5s): {res['mean_ttc']:.2f} s (saved as mean_ttc.csv)")
+    print(f"Mean SSM 2D (SSM ≤ {SSM_UPPER}s): {res['mean_ssm_2d']:.3f} (saved as mean_ssm_2d.csv)")
@@ -1,6 +1,8 @@
 import xml.etree.ElementTree as ET
 import pandas as pd
 import numpy as np
+import fcd_stream, fcd_parallel
+from fcd_kernels import effective_delay
 
 # ---- All parameters set to zero (ideal conditions) ----
 LEADER_LENGTH = 4.5  # meters
@@ -15,12 +17,6 @@ T_P = 0.1            # packet interarrival time (s)
 P_LOSS = 0.0         # packet loss rate (0-1)
 SSM_UPPER = 5.0      # screening threshold for SSM (seconds)
 
-def effective_delay(tau_delay, t_p, p_loss):
-    if p_loss < 1.0:
-        return tau_delay + (p_loss * t_p) / max(1e-6, 1 - p_loss)
-    else:
-        return 1e6
-
 def parse_fcd(fcd_file):
     traj = []
     for event, elem in ET.iterparse(fcd_file, events=("end",)):
@@ -84,26 +80,20 @@ def calculate_ssm_2d(traj,
                         ssm_list.append(ssm)
     return ssm_list
 
+def ssm_params():
+    """Keyword arguments for the SSM kernels from the module constants."""
+    return dict(leader_length=LEADER_LENGTH,
+                leader_width=LEADER_WIDTH,
+                follower_width=FOLLOWER_WIDTH,
+                tau_delay=TAU_DELAY,
+                t_p=T_P,
+                p_loss=P_LOSS,
+                ssm_upper=SSM_UPPER)
+
 if __name__ == "__main__":
-    fcd_file = "fcd.xml"
-    traj = parse_fcd(fcd_file)
-    ssm_values = calculate_ssm_2d(
-        traj,
-        leader_length=LEADER_LENGTH,
-        leader_width=LEADER_WIDTH,
-        follower_width=FOLLOWER_WIDTH,
-        eps_x_max=EPS_X_MAX,
-        eps_y_max=EPS_Y_MAX,
-        eps_vf_max=EPS_VF_MAX,
-        eps_vl_max=EPS_VL_MAX,
-        tau_delay=TAU_DELAY,
-        t_p=T_P,
-        p_loss=P_LOSS,
-        ssm_upper=SSM_UPPER
-    )
-    if ssm_values:
-        mean_ssm = np.mean(ssm_values)
-    else:
-        mean_ssm = float('nan')
+    fcd_file, jobs, net = fcd_parallel.cli_args()
+    mean_ssm = fcd_parallel.run_metrics_parallel(fcd_file,
+                                                 [fcd_stream.MeanSSM2D(net=net, **ssm_params())],
+                                                 jobs, lanes=net.codes() if net else None)["mean_ssm_2d"]
     pd.DataFrame([{"mean_ssm_2d": mean_ssm}]).to_csv("mean_ssm_2d.csv", index=False)
     print(f"Mean SSM 2D (ideal, SSM ≤ {SSM_UPPER}s): {mean_ssm:.3f} (saved as mean_ssm_2d.csv)")
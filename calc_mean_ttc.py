@@ -1,5 +1,6 @@
 import xml.etree.ElementTree as ET
 import pandas as pd
+import fcd_stream, fcd_parallel
 
 def parse_fcd(fcd_file):
     traj = []
@@ -44,14 +45,9 @@ def calculate_ttc(traj, ttc_upper=5):
     return ttc_list
 
 if __name__ == "__main__":
-    fcd_file = "fcd.xml"
-    traj = parse_fcd(fcd_file)
-    ttc_values = calculate_ttc(traj, ttc_upper=5)
-    
-    if ttc_values:
-        mean_ttc = sum(ttc_values) / len(ttc_values)
-    else:
-        mean_ttc = float('nan')
+    fcd_file, jobs, net = fcd_parallel.cli_args()
+    mean_ttc = fcd_parallel.run_metrics_parallel(fcd_file, [fcd_stream.MeanTTC(ttc_upper=5, net=net)],
+                                                 jobs, lanes=net.codes() if net else None)["mean_ttc"]
     
     # Save to CSV
     df = pd.DataFrame([{"mean_ttc": mean_ttc}])
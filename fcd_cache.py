@@ -0,0 +1,163 @@
+"""
+fcd_cache.py — columnar, memory-mapped cache of an FCD file.
+
+The first analysis of `fcd.xml` converts it once into `fcd.xml.cache/`:
+
+    time.f8      one float per timestep
+    offsets.i8   n_steps + 1 row offsets, rows of step k are [off[k], off[k+1])
+    vid.i4 lane.i4 x.f8 y.f8 speed.f8   one value per vehicle row
+    vids.json lanes.json                code -> name tables
+    meta.json                           source key + row / step counts
+
+Later runs memory-map the columns and yield the same `fcd_stream.Timestep`s
+without touching the XML.  The cache is keyed on the source's size, mtime
+and SHA-1: if size or content differ it is rebuilt; if only the mtime moved
+(touch, copy) the hash is checked once and the key refreshed.
+"""
+
+import os, json, shutil, hashlib
+import numpy as np
+import fcd_stream
+
+CACHE_VERSION = 1
+COLUMNS = {"vid": np.int32, "lane": np.int32,
+           "x": np.float64, "y": np.float64, "speed": np.float64}
+
+
+def cache_dir(path):
+    return f"{path}.cache"
+
+
+def file_hash(path, chunk=1 << 20):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        while block := f.read(chunk):
+            h.update(block)
+    return h.hexdigest()
+
+
+def source_key(path, with_hash=True):
+    st = os.stat(path)
+    key = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if with_hash:
+        key["sha1"] = file_hash(path)
+    return key
+
+
+def _column_file(d, name, dtype):
+    return os.path.join(d, f"{name}.{np.dtype(dtype).str[1:]}")   # x.f8, vid.i4
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(cache_dir(path), "meta.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(path):
+    """True if the cache matches the source (refreshing a moved mtime)."""
+    meta = _read_meta(path)
+    if not meta or meta.get("version") != CACHE_VERSION:
+        return False
+    old, now = meta["source"], source_key(path, with_hash=False)
+    if old["size"] != now["size"]:
+        return False
+    if old["mtime_ns"] == now["mtime_ns"]:
+        return True
+    if file_hash(path) != old["sha1"]:
+        return False
+    meta["source"]["mtime_ns"] = now["mtime_ns"]
+    with open(os.path.join(cache_dir(path), "meta.json"), "w") as f:
+        json.dump(meta, f)
+    return True
+
+
+def build(path):
+    """Convert `path` (plain or gzip FCD) into its columnar cache."""
+    final = cache_dir(path)
+    tmp   = final + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    key = source_key(path)
+    vids, lanes = fcd_stream.Codes(), fcd_stream.Codes()
+    times, offsets = [], [0]
+    files = {c: open(_column_file(tmp, c, t), "wb")
+             for c, t in COLUMNS.items()}
+    try:
+        for ts in fcd_stream.iter_timesteps(path, vids, lanes):
+            times.append(ts.time)
+            offsets.append(offsets[-1] + len(ts.x))
+            for c, t in COLUMNS.items():
+                getattr(ts, c).astype(t).tofile(files[c])
+    finally:
+        for fh in files.values():
+            fh.close()
+    np.asarray(times, dtype=np.float64).tofile(_column_file(tmp, "time", np.float64))
+    np.asarray(offsets, dtype=np.int64).tofile(_column_file(tmp, "offsets", np.int64))
+    for name, codes in (("vids", vids), ("lanes", lanes)):
+        with open(os.path.join(tmp, f"{name}.json"), "w") as f:
+            json.dump(codes.names, f)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"version": CACHE_VERSION, "source": key,
+                   "n_steps": len(times), "n_rows": offsets[-1]}, f)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+
+
+class FcdCache:
+    """Memory-mapped view of a built cache."""
+
+    def __init__(self, path):
+        d = cache_dir(path)
+        self.meta = _read_meta(path)
+        self.time    = self._map(d, "time", np.float64, self.meta["n_steps"])
+        self.offsets = self._map(d, "offsets", np.int64, self.meta["n_steps"] + 1)
+        for c, t in COLUMNS.items():
+            setattr(self, c, self._map(d, c, t, self.meta["n_rows"]))
+        with open(os.path.join(d, "vids.json")) as f:
+            self.vid_names = json.load(f)
+        with open(os.path.join(d, "lanes.json")) as f:
+            self.lane_names = json.load(f)
+
+    @staticmethod
+    def _map(d, name, dtype, n):
+        if n == 0:          # np.memmap refuses empty files
+            return np.empty(0, dtype=dtype)
+        return np.memmap(_column_file(d, name, dtype), dtype=dtype, mode="r", shape=(n,))
+
+    def __len__(self):
+        return len(self.time)
+
+    def timestep(self, k, lane_map=None):
+        a, b = self.offsets[k], self.offsets[k + 1]
+        lane = self.lane[a:b] if lane_map is None else lane_map[self.lane[a:b]]
+        return fcd_stream.Timestep(float(self.time[k]), self.vid[a:b],
+                                   self.x[a:b], self.y[a:b],
+                                   self.speed[a:b], lane)
+
+    def iter_timesteps(self, start=0, stop=None, lanes=None):
+        """Timesteps start..stop; with a `Codes` table `lanes` the lane codes
+        are translated into it (as if streamed with that table)."""
+        lane_map = None if lanes is None else \
+            np.asarray([lanes.code(n) for n in self.lane_names], dtype=np.int64)
+        for k in range(start, len(self) if stop is None else stop):
+            yield self.timestep(k, lane_map)
+
+
+def load(path):
+    """Open the cache for `path`, (re)building it first if it is stale."""
+    if not is_fresh(path):
+        build(path)
+    return FcdCache(path)
+
+
+def timesteps(path, lanes=None):
+    """Timesteps of `path` via the cache; falls back to streaming the XML
+    when the cache directory cannot be written."""
+    try:
+        return load(path).iter_timesteps(lanes=lanes)
+    except OSError as e:
+        print(f"FCD cache unavailable ({e}); streaming {path}")
+        return fcd_stream.iter_timesteps(path, lanes=lanes)
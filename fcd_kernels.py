@@ -0,0 +1,231 @@
+"""
+fcd_kernels.py — vectorised leader / TTC / 2D-SSM kernels for FCD analysis.
+
+`calculate_ttc` and `calculate_ssm_2d` find every vehicle's leader with a
+nested loop over the timestep (O(n²) dict lookups).  Here the vehicles of a
+timestep — or of a whole batch of timesteps — are sorted once by
+(step, lane, x); a vehicle's leader is then simply the first vehicle after
+its own x in the same (step, lane) group, and the metrics are array maths.
+
+The results match the loop versions value for value (same leader choice,
+including ties on x, and the same floating-point expressions), which stay in
+calc_mean_ttc.py / calc_mean_ssm_2d.py as the reference implementation.
+"""
+
+import collections
+import numpy as np
+
+
+def effective_delay(tau_delay, t_p, p_loss):
+    """Delay plus the mean extra age lost packets add; scalars or arrays."""
+    if np.ndim(tau_delay) == np.ndim(t_p) == np.ndim(p_loss) == 0:
+        if p_loss < 1.0:
+            return tau_delay + (p_loss * t_p) / max(1e-6, 1 - p_loss)
+        else:
+            return 1e6
+    p_loss = np.asarray(p_loss, dtype=float)
+    return np.where(p_loss < 1.0,
+                    tau_delay + (p_loss * t_p) / np.maximum(1e-6, 1 - p_loss),
+                    1e6)
+
+
+# ---------------------------------------------------------------------------
+# Leader search
+# ---------------------------------------------------------------------------
+def find_leaders(x, lane, step=None):
+    """Index of each vehicle's leader (-1 if none).
+
+    The leader is the vehicle with the smallest x strictly greater than the
+    ego's x on the same lane (and, if given, in the same step).  Among
+    vehicles tied on x the earliest one in input order wins, as in the
+    reference loop."""
+    x = np.asarray(x, dtype=float)
+    n = len(x)
+    if n == 0:
+        return np.empty(0, dtype=np.intp)
+    keys  = (x, lane) if step is None else (x, lane, step)
+    order = np.lexsort(keys)                     # stable: ties keep input order
+    xs    = x[order]
+    grp   = np.asarray(lane)[order]
+    same  = grp[1:] == grp[:-1]
+    if step is not None:
+        same &= np.asarray(step)[order][1:] == np.asarray(step)[order][:-1]
+
+    # runs of identical (step, lane, x); the leader is the head of the next run
+    new_run       = np.ones(n, dtype=bool)
+    new_run[1:]   = ~same | (xs[1:] != xs[:-1])
+    run_starts    = np.flatnonzero(new_run)
+    next_start    = np.append(run_starts[1:], n)[np.cumsum(new_run) - 1]
+
+    # ... provided that run is still in the same (step, lane) group
+    same_grp      = np.zeros(n, dtype=bool)
+    inside        = next_start < n
+    same_grp[inside] = np.append(same, False)[next_start[inside] - 1]
+
+    leader = np.full(n, -1, dtype=np.intp)
+    leader[order[same_grp]] = order[next_start[same_grp]]
+    return leader
+
+
+def leader_pairs(x, lane, step=None):
+    """(follower, leader) index arrays, followers in input order."""
+    leader = find_leaders(x, lane, step)
+    f = np.flatnonzero(leader >= 0)
+    return f, leader[f]
+
+
+def _pair_offsets(x, y, lane, step, leader_length, pairs):
+    """(follower, leader, longitudinal clearance, lateral offset) per pair."""
+    if pairs is None:
+        f, l = leader_pairs(x, lane, step)
+        return f, l, (x[l] - leader_length) - x[f], y[f] - y[l]
+    f, l, dx, dy = pairs
+    return f, l, dx - leader_length, dy
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+def ttc_values(x, speed, lane, step=None, ttc_upper=5, pairs=None):
+    """TTC of every follower that is closing in on its leader, TTC <= ttc_upper.
+
+    `pairs` = (follower, leader, dx, dy) from `net_index.NetIndex.leader_pairs`
+    replaces the same-lane x-order leader search."""
+    x, speed = np.asarray(x, dtype=float), np.asarray(speed, dtype=float)
+    if pairs is None:
+        f, l = leader_pairs(x, lane, step)
+        dx   = x[l] - x[f]
+    else:
+        f, l, dx, _ = pairs
+    rel = speed[f] - speed[l]
+    closing = rel > 0
+    ttc = dx[closing] / rel[closing]
+    return ttc[ttc <= ttc_upper]
+
+
+def ssm_2d_values(x, y, speed, lane, step=None,
+                  leader_length=4.5,
+                  leader_width=1.8,
+                  follower_width=1.8,
+                  tau_delay=0.0,
+                  t_p=0.1,
+                  p_loss=0.0,
+                  ssm_upper=5.0,
+                  pairs=None):
+    """2D SSM of every closing follower/leader pair, 0 < SSM <= ssm_upper
+    (`pairs` as in `ttc_values`)."""
+    x, y  = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    speed = np.asarray(speed, dtype=float)
+    eff_delay = effective_delay(tau_delay, t_p, p_loss)
+    f, l, gap_x, dy = _pair_offsets(x, y, lane, step, leader_length, pairs)
+    delta_x = np.maximum(0, gap_x)
+    delta_y = np.maximum(0, np.abs(dy) - (follower_width + leader_width)/2)
+    denom   = speed[f] - speed[l]
+    num     = np.sqrt(delta_x**2 + delta_y**2) - denom * eff_delay
+    closing = denom > 0
+    ssm = num[closing] / denom[closing]
+    return ssm[(ssm > 0) & (ssm <= ssm_upper)]
+
+
+# ---------------------------------------------------------------------------
+# What-if grid over channel parameters
+# ---------------------------------------------------------------------------
+SsmTerms = collections.namedtuple("SsmTerms", "gap_x gap_y v_f v_l")
+
+def ssm_pair_terms(x, y, speed, lane, step=None,
+                   leader_length=4.5, leader_width=1.8, follower_width=1.8,
+                   pairs=None):
+    """The parts of the 2D SSM that do not depend on the channel: signed
+    longitudinal / lateral clearances and both speeds, one entry per pair."""
+    x, y  = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    speed = np.asarray(speed, dtype=float)
+    f, l, gap_x, dy = _pair_offsets(x, y, lane, step, leader_length, pairs)
+    return SsmTerms(gap_x,
+                    np.abs(dy) - (follower_width + leader_width)/2,
+                    speed[f], speed[l])
+
+
+def grid_combos(tau_delay=0.0, t_p=0.1, p_loss=0.0,
+                eps_x=0.0, eps_y=0.0, eps_vf=0.0, eps_vl=0.0):
+    """Cartesian product of the parameter values (scalars or 1-D arrays) as
+    a dict of equal-length columns, in `np.meshgrid(indexing="ij")` order."""
+    names = ("tau_delay", "t_p", "p_loss", "eps_x", "eps_y", "eps_vf", "eps_vl")
+    axes  = [np.atleast_1d(np.asarray(v, dtype=float))
+             for v in (tau_delay, t_p, p_loss, eps_x, eps_y, eps_vf, eps_vl)]
+    return dict(zip(names, (g.ravel() for g in np.meshgrid(*axes, indexing="ij"))))
+
+
+def ssm_grid_chunks(terms, combo, ssm_upper=5.0, max_cells=4_000_000):
+    """Yield (combination slice, SSM matrix) for the pairs in `terms`: one
+    row per combination of `grid_combos` output, NaN where the pair does not
+    count (not closing, SSM <= 0 or > ssm_upper).  At most `max_cells`
+    combination × pair cells per chunk."""
+    eff = effective_delay(combo["tau_delay"], combo["t_p"], combo["p_loss"])
+    n   = len(eff)
+
+    # pairs that cannot close under any speed error never contribute
+    dv   = terms.v_f - terms.v_l
+    keep = dv + (combo["eps_vf"] - combo["eps_vl"]).max() > 0
+    gap_x, gap_y = terms.gap_x[keep], terms.gap_y[keep]
+    v_f, v_l     = terms.v_f[keep], terms.v_l[keep]
+
+    chunk = max(1, max_cells // max(len(v_f), 1))
+    for a in range(0, n, chunk):
+        c = slice(a, min(a + chunk, n))
+        col = lambda k: combo[k][c, None]
+        delta_x = np.maximum(0, gap_x + col("eps_x"))
+        delta_y = np.maximum(0, gap_y + col("eps_y"))
+        denom   = (v_f + col("eps_vf")) - (v_l + col("eps_vl"))
+        num     = np.sqrt(delta_x**2 + delta_y**2) - denom * eff[c, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ssm = num / denom
+        valid = (denom > 0) & (ssm > 0) & (ssm <= ssm_upper)
+        yield c, np.where(valid, ssm, np.nan)
+
+
+def ssm_grid(terms, tau_delay=0.0, t_p=0.1, p_loss=0.0,
+             eps_x=0.0, eps_y=0.0, eps_vf=0.0, eps_vl=0.0,
+             ssm_upper=5.0, max_cells=4_000_000):
+    """SSM summary for every combination of the given parameter values.
+
+    Each argument may be a scalar or a 1-D array; the Cartesian product is
+    evaluated against all pairs in `terms` at once (in chunks of at most
+    `max_cells` combination × pair cells).  Detection errors are signed
+    offsets added to the measured gap / speed, like `eps_x` in the runner;
+    with all of them 0 a row equals `ssm_2d_values` for that channel.
+
+    Returns a dict of equal-length arrays: the parameter columns plus
+    ssm_mean, ssm_p1, ssm_median and n_ssm."""
+    combo = grid_combos(tau_delay, t_p, p_loss, eps_x, eps_y, eps_vf, eps_vl)
+    n     = len(combo["tau_delay"])
+    out = {k: np.full(n, np.nan) for k in ("ssm_mean", "ssm_p1", "ssm_median")}
+    out["n_ssm"] = np.zeros(n, dtype=np.int64)
+    for c, ssm in ssm_grid_chunks(terms, combo, ssm_upper, max_cells):
+        cnt = (~np.isnan(ssm)).sum(axis=1)
+        out["n_ssm"][c] = cnt
+        has = cnt > 0
+        if has.any():
+            ssm = ssm[has]
+            idx = np.arange(c.start, c.stop)[has]
+            out["ssm_mean"][idx]   = np.nanmean(ssm, axis=1)
+            out["ssm_p1"][idx]     = np.nanpercentile(ssm, 1, axis=1)
+            out["ssm_median"][idx] = np.nanmedian(ssm, axis=1)
+    return {**combo, **out}
+
+
+# ---------------------------------------------------------------------------
+# Adapters
+# ---------------------------------------------------------------------------
+def traj_to_arrays(traj):
+    """Flatten a `parse_fcd` trajectory into (step, x, y, speed, lane_code)
+    arrays, vehicles in document order.  Lanes are integer-coded (a missing
+    lane attribute gets its own code, as `None == None` in the loops)."""
+    lanes, step, x, y, speed, lane = {}, [], [], [], [], []
+    for k, ts in enumerate(traj):
+        for v in ts["vehicles"].values():
+            step.append(k)
+            x.append(v["x"]); y.append(v["y"]); speed.append(v["speed"])
+            lane.append(lanes.setdefault(v["lane"], len(lanes)))
+    return (np.asarray(step, dtype=np.int64), np.asarray(x, dtype=float),
+            np.asarray(y, dtype=float), np.asarray(speed, dtype=float),
+            np.asarray(lane, dtype=np.int64))
@@ -0,0 +1,144 @@
+"""
+fcd_parallel.py — run FCD metrics over disjoint timestep ranges in parallel.
+
+TTC and SSM only ever compare vehicles of the same timestep, so a trace can
+be cut at any `<timestep>` boundary.  `index_timesteps()` records the byte
+offset of every `<timestep` tag (one `mmap.find` scan, saved next to the file
+as `<fcd>.tsidx.npz` and reused while size and mtime match).  The steps are
+split into ranges of about equal bytes; each worker parses only its range and
+returns its metric objects, which are merged in range order with their
+`merge()` methods (count and sum for the means, plus the per-combination
+sketches for the grid).
+
+If the columnar cache (fcd_cache.py) is already fresh the workers read their
+step ranges from it instead of the XML.  gzip input has no random access and
+is analysed serially.  `lanes` seeds the lane codes of every part (pass
+`net.codes()` for metrics that use a net_index.NetIndex).
+
+    res = run_metrics_parallel("fcd.xml", [MeanTTC(), MeanSSM2D()], jobs=8)
+"""
+
+import io, mmap, copy, argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import fcd_stream, fcd_cache
+
+PART_BYTES = 64 << 20          # upper bound on the XML one worker holds at once
+
+
+def _index_file(path):
+    return f"{path}.tsidx.npz"
+
+
+def index_timesteps(path):
+    """Byte offsets of every `<timestep` tag plus the end of the last one."""
+    key = fcd_cache.source_key(path, with_hash=False)
+    try:
+        with np.load(_index_file(path)) as z:
+            if int(z["size"]) == key["size"] and int(z["mtime_ns"]) == key["mtime_ns"]:
+                return z["offsets"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    offsets = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = mm.find(b"<timestep")
+        while pos != -1:
+            offsets.append(pos)
+            pos = mm.find(b"<timestep", pos + 9)
+        end = mm.rfind(b"</fcd-export>")
+        offsets.append(len(mm) if end == -1 else end)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    try:
+        with open(_index_file(path), "wb") as f:
+            np.savez(f, offsets=offsets, size=key["size"], mtime_ns=key["mtime_ns"])
+    except OSError:
+        pass                    # read-only directory: just index again next time
+    return offsets
+
+
+def partition(weights_cum, parts):
+    """Split steps 0..n-1 into at most `parts` contiguous ranges of about
+    equal weight; `weights_cum` has n + 1 cumulative entries."""
+    n = len(weights_cum) - 1
+    if n <= 0:
+        return []
+    cuts = np.searchsorted(weights_cum,
+                           np.linspace(weights_cum[0], weights_cum[-1], parts + 1))
+    cuts = np.unique(np.clip(cuts, 0, n))
+    cuts[0], cuts[-1] = 0, n
+    return [(int(a), int(b)) for a, b in zip(cuts[:-1], cuts[1:]) if b > a]
+
+
+def cli_args(argv=None, description=None):
+    """(fcd_file, jobs, net) from the command line of the calc_*.py scripts;
+    net is the loaded net_index.NetIndex or None."""
+    ap = argparse.ArgumentParser(description=description)
+    ap.add_argument("fcd_file", nargs="?", default="fcd.xml", help=".xml or .xml.gz")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="worker processes over disjoint timestep ranges (1 = serial)")
+    ap.add_argument("--net", default=None,
+                    help="SUMO net file: find leaders along the lane network "
+                         "(curved lanes, across junctions) instead of by x per lane id")
+    args = ap.parse_args(argv)
+    net = None
+    if args.net:
+        import net_index
+        net = net_index.load(args.net)
+    return args.fcd_file, args.jobs, net
+
+
+# ---------------------------------------------------------------------------
+# Workers (module level so they pickle)
+# ---------------------------------------------------------------------------
+def _xml_part(path, start, stop, metrics, lanes):
+    with open(path, "rb") as f:
+        f.seek(start)
+        body = f.read(stop - start)
+    xml = io.BytesIO(b"<fcd-export>" + body + b"</fcd-export>")
+    fcd_stream.run_metrics(path, metrics,
+                           timesteps=fcd_stream.parse_timesteps(xml, lanes=lanes))
+    return metrics
+
+
+def _cache_part(path, k0, k1, metrics, lanes):
+    cache = fcd_cache.FcdCache(path)
+    fcd_stream.run_metrics(path, metrics, timesteps=cache.iter_timesteps(k0, k1, lanes))
+    return metrics
+
+
+def _is_gzip(path):
+    with open(path, "rb") as f:
+        return f.read(2) == b"\x1f\x8b"
+
+
+def run_metrics_parallel(path, metrics, jobs, lanes=None):
+    """`fcd_stream.run_metrics` spread over `jobs` processes; returns the
+    merged `result()` dicts.  jobs <= 1 is the plain cached / streamed pass."""
+    if jobs <= 1:
+        return fcd_stream.run_metrics(path, metrics,
+                                      timesteps=fcd_cache.timesteps(path, lanes))
+    if fcd_cache.is_fresh(path):
+        cache = fcd_cache.FcdCache(path)
+        parts = partition(np.asarray(cache.offsets), jobs * 4)
+        work  = [(_cache_part, path, a, b) for a, b in parts]
+    elif _is_gzip(path):
+        print(f"{path} is gzip-compressed (no random access); analysing serially")
+        return fcd_stream.run_metrics(path, metrics,
+                                      timesteps=fcd_stream.iter_timesteps(path, lanes=lanes))
+    else:
+        offs  = index_timesteps(path)
+        n     = max(jobs * 4, -(-int(offs[-1] - offs[0]) // PART_BYTES))
+        parts = partition(offs, n)
+        work  = [(_xml_part, path, int(offs[a]), int(offs[b])) for a, b in parts]
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futs = [pool.submit(fn, p, a, b, copy.deepcopy(metrics), lanes)
+                for fn, p, a, b in work]
+        for fut in futs:                          # range order: deterministic merge
+            for m, part in zip(metrics, fut.result()):
+                m.merge(part)
+    out = {}
+    for m in metrics:
+        out.update(m.result())
+    return out
@@ -0,0 +1,209 @@
+"""
+fcd_stream.py — one streaming pass over an FCD file for every metric.
+
+`iter_timesteps()` reads `fcd.xml` (or `fcd.xml.gz`, detected from the magic
+bytes) incrementally and yields one `Timestep` of compact NumPy arrays at a
+time, so memory is bounded by a single timestep.  Metrics subscribe to the
+stream: anything with `update(timestep)` and `result() -> dict` can be passed
+to `run_metrics()`, which feeds all of them from the same pass.  The built-in
+metrics also `merge()` partial results of disjoint timestep ranges
+(fcd_parallel.py), and take an optional `net` (net_index.py): leaders are then
+found along the lane network instead of by x within a lane id, which needs
+the timesteps' lane codes to come from `net.codes()`.
+
+    ttc, ssm = MeanTTC(), MeanSSM2D(tau_delay=0.2)
+    run_metrics("fcd.xml.gz", [ttc, ssm])
+    ttc.result()   # {"mean_ttc": ...}
+"""
+
+import gzip, collections
+import xml.etree.ElementTree as ET
+import numpy as np
+import fcd_kernels
+from online_stats import StreamingStats
+
+# vid / lane are integer codes into a Codes table shared by the whole stream
+Timestep = collections.namedtuple("Timestep", "time vid x y speed lane")
+
+
+class Codes(dict):
+    """Interns strings as consecutive integer codes (`None` included)."""
+
+    def __init__(self):
+        super().__init__()
+        self.names = []
+
+    def code(self, name):
+        c = self.get(name)
+        if c is None:
+            c = self[name] = len(self.names)
+            self.names.append(name)
+        return c
+
+
+def open_fcd(path):
+    """Binary file object for a plain or gzip-compressed FCD file."""
+    f = open(path, "rb")
+    if f.read(2) == b"\x1f\x8b":
+        f.close()
+        return gzip.open(path, "rb")
+    f.seek(0)
+    return f
+
+
+def iter_timesteps(path, vids=None, lanes=None):
+    """Yield the FCD file one `Timestep` at a time, vehicles in document
+    order.  Pass your own `Codes` tables to map codes back to names."""
+    with open_fcd(path) as f:
+        yield from parse_timesteps(f, vids, lanes)
+
+
+def parse_timesteps(f, vids=None, lanes=None):
+    """`iter_timesteps` for an open binary file object holding FCD XML."""
+    vids  = Codes() if vids is None else vids
+    lanes = Codes() if lanes is None else lanes
+    context = ET.iterparse(f, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event != "end" or elem.tag != "timestep":
+            continue
+        n = len(elem)
+        vid  = np.empty(n, dtype=np.int64)
+        lane = np.empty(n, dtype=np.int64)
+        x, y, speed = np.empty(n), np.empty(n), np.empty(n)
+        for i, v in enumerate(elem):
+            a = v.attrib
+            vid[i]   = vids.code(a["id"])
+            x[i]     = float(a["x"])
+            y[i]     = float(a["y"])
+            speed[i] = float(a["speed"])
+            lane[i]  = lanes.code(a.get("lane", None))
+        yield Timestep(float(elem.attrib["time"]), vid, x, y, speed, lane)
+        root.clear()
+
+
+def run_metrics(path, metrics, timesteps=None):
+    """Feed every timestep of `path` (or of an iterable of Timesteps) to each
+    metric in turn; returns the merged `result()` dicts."""
+    for ts in (iter_timesteps(path) if timesteps is None else timesteps):
+        for m in metrics:
+            m.update(ts)
+    out = {}
+    for m in metrics:
+        out.update(m.result())
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Metric subscribers
+# ---------------------------------------------------------------------------
+def _net_pairs(net, ts):
+    return None if net is None else net.leader_pairs(ts.x, ts.y, ts.lane)
+
+
+class MeanTTC:
+    """Mean TTC over all closing follower/leader pairs with TTC <= ttc_upper."""
+
+    def __init__(self, ttc_upper=5, net=None):
+        self.ttc_upper, self.net = ttc_upper, net
+        self.total, self.count = 0.0, 0
+
+    def update(self, ts):
+        vals = fcd_kernels.ttc_values(ts.x, ts.speed, ts.lane,
+                                      ttc_upper=self.ttc_upper,
+                                      pairs=_net_pairs(self.net, ts))
+        self.total  = sum(vals.tolist(), self.total)
+        self.count += len(vals)
+
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+        return self
+
+    def result(self):
+        return {"mean_ttc": self.total / self.count if self.count else float("nan")}
+
+
+class MeanSSM2D:
+    """Mean 2D SSM over all closing pairs with 0 < SSM <= ssm_upper; keyword
+    arguments are those of `fcd_kernels.ssm_2d_values`."""
+
+    def __init__(self, net=None, **params):
+        self.params, self.net = params, net
+        self.total, self.count = 0.0, 0
+
+    def update(self, ts):
+        vals = fcd_kernels.ssm_2d_values(ts.x, ts.y, ts.speed, ts.lane,
+                                         pairs=_net_pairs(self.net, ts),
+                                         **self.params)
+        self.total  = sum(vals.tolist(), self.total)
+        self.count += len(vals)
+
+    def merge(self, other):
+        self.total += other.total
+        self.count += other.count
+        return self
+
+    def result(self):
+        return {"mean_ssm_2d": self.total / self.count if self.count else float("nan")}
+
+
+class SSMGrid:
+    """SSM summary over a parameter grid (keyword arrays tau_delay, p_loss,
+    eps_x, ... as for `fcd_kernels.ssm_grid`).  Each timestep is reduced at
+    once into per-combination count and sum (exact mean); its SSM values are
+    buffered and, every `flush` values, bulk-inserted into one
+    `online_stats.StreamingStats` sketch per combination (p1 / median within
+    ±alpha) — so memory does not grow with the trajectory."""
+
+    def __init__(self, leader_length=4.5, leader_width=1.8, follower_width=1.8,
+                 net=None, alpha=0.005, ssm_upper=5.0, max_cells=4_000_000,
+                 flush=1 << 21, **grid):
+        self.geometry = dict(leader_length=leader_length,
+                             leader_width=leader_width,
+                             follower_width=follower_width)
+        self.net, self.ssm_upper, self.max_cells = net, ssm_upper, max_cells
+        self.combo = fcd_kernels.grid_combos(**grid)
+        n = len(self.combo["tau_delay"])
+        self.count = np.zeros(n, dtype=np.int64)
+        self.total = np.zeros(n)
+        self.stats = [StreamingStats(alpha) for _ in range(n)]
+        self.flush, self.pending, self.n_pending = flush, [], 0
+
+    def update(self, ts):
+        terms = fcd_kernels.ssm_pair_terms(ts.x, ts.y, ts.speed, ts.lane,
+                                           pairs=_net_pairs(self.net, ts),
+                                           **self.geometry)
+        for c, ssm in fcd_kernels.ssm_grid_chunks(terms, self.combo, self.ssm_upper,
+                                                  self.max_cells):
+            valid = ~np.isnan(ssm)
+            self.count[c] += valid.sum(axis=1)
+            self.total[c] += np.where(valid, ssm, 0.0).sum(axis=1)
+            self.pending.append((np.nonzero(valid)[0] + c.start, ssm[valid]))
+            self.n_pending += len(self.pending[-1][1])
+        if self.n_pending >= self.flush:
+            self._insert()
+
+    def _insert(self):
+        if self.pending:
+            rows, vals = (np.concatenate(col) for col in zip(*self.pending))
+            StreamingStats.update_rows(self.stats, rows, vals)
+            self.pending, self.n_pending = [], 0
+
+    def merge(self, other):
+        self._insert()
+        other._insert()
+        self.count += other.count
+        self.total += other.total
+        for mine, theirs in zip(self.stats, other.stats):
+            mine.merge(theirs)
+        return self
+
+    def result(self):
+        self._insert()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(self.count > 0, self.total / self.count, np.nan)
+        return {"ssm_grid": {**self.combo, "ssm_mean": mean,
+                             "ssm_p1":     np.array([s.quantile(0.01) for s in self.stats]),
+                             "ssm_median": np.array([s.median() for s in self.stats]),
+                             "n_ssm":      self.count.copy()}}
@@ -0,0 +1,315 @@
+"""
+net_index.py — compiled, cached lane-geometry index of a SUMO network.
+
+The FCD analysis needs, per vehicle, the position along its lane and the
+lanes that follow it; parsing `osm.net.xml` for that on every run is slow.
+`load()` compiles the network once into `<net>.netidx.npz`:
+
+    names length width             one entry per lane (internal lanes too)
+    pt_off px py pt_s              lane shapes: points of lane k are
+                                   [pt_off[k], pt_off[k+1]), pt_s = distance
+                                   along the shape
+    succ_off succ                  successor lanes (CSR), through the
+                                   internal junction lanes (`via`)
+    grid_* cell_off cell_seg       uniform grid: shape segments per cell,
+                                   for coordinate -> lane lookup
+
+and later runs just `np.load` it.  The index is keyed like the FCD cache
+(fcd_cache.py): size, mtime and SHA-1 of the net file; a changed file is
+recompiled, a touched one is re-hashed once.
+
+    net = load("osm.net.xml")
+    s, lat = net.project(lanes, x, y)              # along-lane / lateral offset
+    f, l, dx, dy = net.leader_pairs(x, y, lanes)   # leaders across junctions
+
+Lane codes are indices into `net.names`; `net.codes()` gives an
+`fcd_stream.Codes` table pre-seeded with them, so timesteps streamed with it
+carry network lane indices directly (unknown lanes get codes >= len(net)).
+"""
+
+import os, heapq
+import xml.etree.ElementTree as ET
+import numpy as np
+import fcd_stream, fcd_cache, fcd_kernels
+
+INDEX_VERSION = 1
+CELL    = 50.0       # grid cell size (m)
+HORIZON = 150.0      # how far downstream leader_pairs looks past a lane end (m)
+
+
+def index_file(path):
+    return f"{path}.netidx.npz"
+
+
+# ---------------------------------------------------------------------------
+# Compilation
+# ---------------------------------------------------------------------------
+def _shape(text):
+    pts = [p.split(",") for p in text.split()]
+    return [float(p[0]) for p in pts], [float(p[1]) for p in pts]
+
+
+def compile_net(path, cell=CELL):
+    """Arrays of the index for the net file `path` (plain or gzip)."""
+    names, length, width, px, py, pt_off = [], [], [], [], [], [0]
+    conns = []
+    with fcd_stream.open_fcd(path) as f:
+        for _, el in ET.iterparse(f):
+            if el.tag == "lane":
+                xs, ys = _shape(el.get("shape"))
+                names.append(el.get("id"))
+                length.append(float(el.get("length")))
+                width.append(float(el.get("width", 3.2)))
+                px += xs
+                py += ys
+                pt_off.append(len(px))
+            elif el.tag == "connection":
+                conns.append((f"{el.get('from')}_{el.get('fromLane')}",
+                              el.get("via") or f"{el.get('to')}_{el.get('toLane')}"))
+            elif el.tag == "edge":
+                el.clear()
+
+    lane_of = {n: k for k, n in enumerate(names)}
+    pt_off  = np.asarray(pt_off, dtype=np.int64)
+    px, py  = np.asarray(px), np.asarray(py)
+
+    # distance along each shape, restarting at every lane's first point
+    step = np.hypot(np.diff(px, prepend=px[:1]), np.diff(py, prepend=py[:1]))
+    step[pt_off[:-1]] = 0.0
+    pt_s = np.cumsum(step)
+    pt_s -= np.repeat(pt_s[pt_off[:-1]], np.diff(pt_off))
+
+    edges = sorted({(lane_of[a], lane_of[b]) for a, b in conns
+                    if a in lane_of and b in lane_of})
+    frm   = np.asarray([a for a, _ in edges], dtype=np.int64)
+    succ  = np.asarray([b for _, b in edges], dtype=np.int64)
+    succ_off = np.searchsorted(frm, np.arange(len(names) + 1))
+
+    # segment j runs from point j to j + 1 (the last point of a lane starts none)
+    last = np.zeros(len(px), dtype=bool)
+    last[pt_off[1:] - 1] = True
+    seg  = np.flatnonzero(~last)
+    wmax = max(width, default=3.2)
+    x0, y0 = px.min() - wmax, py.min() - wmax
+    nx = int((px.max() + wmax - x0) // cell) + 1
+    ny = int((py.max() + wmax - y0) // cell) + 1
+    lo_x = ((np.minimum(px[seg], px[seg + 1]) - wmax - x0) // cell).astype(np.int64)
+    hi_x = ((np.maximum(px[seg], px[seg + 1]) + wmax - x0) // cell).astype(np.int64)
+    lo_y = ((np.minimum(py[seg], py[seg + 1]) - wmax - y0) // cell).astype(np.int64)
+    hi_y = ((np.maximum(py[seg], py[seg + 1]) + wmax - y0) // cell).astype(np.int64)
+    cells, segs = [], []
+    for j, a, b, c, d in zip(seg, lo_x, hi_x, lo_y, hi_y):
+        gx, gy = np.meshgrid(np.arange(a, b + 1), np.arange(c, d + 1))
+        cells.append((gy * nx + gx).ravel())
+        segs.append(np.full(gx.size, j))
+    cells = np.concatenate(cells) if cells else np.empty(0, dtype=np.int64)
+    segs  = np.concatenate(segs) if segs else np.empty(0, dtype=np.int64)
+    order = np.argsort(cells, kind="stable")
+    cell_off = np.searchsorted(cells[order], np.arange(nx * ny + 1))
+
+    return {"names": np.asarray(names, dtype=str),
+            "length": np.asarray(length), "width": np.asarray(width),
+            "pt_off": pt_off, "px": px, "py": py, "pt_s": pt_s,
+            "succ_off": succ_off, "succ": succ,
+            "grid_origin": np.array([x0, y0]), "grid_cell": np.float64(cell),
+            "grid_shape": np.array([nx, ny]),
+            "cell_off": cell_off, "cell_seg": segs[order]}
+
+
+def _save(path, arrays, key):
+    tmp = index_file(path) + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, version=INDEX_VERSION, size=key["size"], mtime_ns=key["mtime_ns"],
+                 sha1=key["sha1"], **arrays)
+    os.replace(tmp, index_file(path))
+
+
+def load(path):
+    """The index of `path`, from `<path>.netidx.npz` when it is up to date,
+    otherwise compiled (and saved if the directory is writable)."""
+    now = fcd_cache.source_key(path, with_hash=False)
+    try:
+        with np.load(index_file(path)) as z:
+            arrays = {k: z[k] for k in z.files}
+        if int(arrays["version"]) == INDEX_VERSION and int(arrays["size"]) == now["size"]:
+            if int(arrays["mtime_ns"]) == now["mtime_ns"]:
+                return NetIndex(arrays)
+            sha1 = fcd_cache.file_hash(path)
+            if str(arrays["sha1"]) == sha1:
+                idx = NetIndex(arrays)
+                try:
+                    _save(path, idx.arrays, {**now, "sha1": sha1})
+                except OSError:
+                    pass
+                return idx
+    except (OSError, ValueError, KeyError):
+        pass
+
+    key    = fcd_cache.source_key(path)
+    arrays = compile_net(path)
+    try:
+        _save(path, arrays, key)
+    except OSError as e:
+        print(f"net index not saved ({e}); compiling {path} again next time")
+    return NetIndex(arrays)
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+class NetIndex:
+
+    FIELDS = ("names", "length", "width", "pt_off", "px", "py", "pt_s",
+              "succ_off", "succ", "grid_origin", "grid_cell", "grid_shape",
+              "cell_off", "cell_seg")
+
+    def __init__(self, arrays):
+        self.arrays = {k: arrays[k] for k in self.FIELDS}
+        for k, v in self.arrays.items():
+            setattr(self, k, v)
+        self.lane_of = {n: k for k, n in enumerate(self.names.tolist())}
+        geom = self.pt_s[self.pt_off[1:] - 1]
+        self.scale = np.where(geom > 0, self.length / np.maximum(geom, 1e-9), 1.0)
+        self.pt_lane = np.repeat(np.arange(len(self)), np.diff(self.pt_off))
+        self._down = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def codes(self):
+        """A `fcd_stream.Codes` whose first codes are this net's lanes."""
+        c = fcd_stream.Codes()
+        for name in self.names.tolist():
+            c.code(name)
+        return c
+
+    def successors(self, lane):
+        return self.succ[self.succ_off[lane]:self.succ_off[lane + 1]]
+
+    def _closest(self, q, seg, x, y, n):
+        """Nearest of the candidate segments `seg` to query point q[i], for
+        n queries: (segment, along-lane position, signed lateral offset),
+        segment -1 where a query had no candidate."""
+        x0, y0 = self.px[seg], self.py[seg]
+        ux, uy = self.px[seg + 1] - x0, self.py[seg + 1] - y0
+        ll = ux * ux + uy * uy
+        t  = np.clip(((x[q] - x0) * ux + (y[q] - y0) * uy) / np.maximum(ll, 1e-12), 0, 1)
+        ex, ey = x[q] - (x0 + t * ux), y[q] - (y0 + t * uy)
+        d2 = ex * ex + ey * ey
+        order = np.lexsort((d2, q))
+        best  = order[np.r_[True, q[order][1:] != q[order][:-1]]] if len(q) else order
+        j = seg[best]
+        out_seg = np.full(n, -1, dtype=np.int64)
+        s, lat  = np.full(n, np.nan), np.full(n, np.nan)
+        out_seg[q[best]] = j
+        s[q[best]]   = (self.pt_s[j] + t[best] * np.sqrt(ll[best])) * self.scale[self.pt_lane[j]]
+        lat[q[best]] = np.copysign(np.sqrt(d2[best]),
+                                   ux[best] * ey[best] - uy[best] * ex[best])
+        return out_seg, s, lat
+
+    def project(self, lane, x, y):
+        """Along-lane position (in lane-length metres, like FCD `pos`) and
+        signed lateral offset (left positive) of points on known lanes."""
+        lane = np.asarray(lane, dtype=np.int64)
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        a    = self.pt_off[lane]
+        nseg = self.pt_off[lane + 1] - a - 1
+        q    = np.repeat(np.arange(len(lane)), nseg)
+        seg  = np.arange(nseg.sum()) - np.repeat(np.cumsum(nseg) - nseg, nseg) \
+               + np.repeat(a, nseg)
+        _, s, lat = self._closest(q, seg, x, y, len(lane))
+        return s, lat
+
+    def locate(self, x, y):
+        """Nearest lane to each point among the shapes in its grid cell
+        (-1 off the grid or if the cell is empty)."""
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        nx, ny = self.grid_shape
+        gx = np.floor((x - self.grid_origin[0]) / self.grid_cell).astype(np.int64)
+        gy = np.floor((y - self.grid_origin[1]) / self.grid_cell).astype(np.int64)
+        inside = (gx >= 0) & (gx < nx) & (gy >= 0) & (gy < ny)
+        cell = np.where(inside, gy * nx + gx, 0)
+        a, b = self.cell_off[cell], self.cell_off[cell + 1]
+        cnt  = np.where(inside, b - a, 0)
+        q    = np.repeat(np.arange(len(x)), cnt)
+        seg  = self.cell_seg[np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+                             + np.repeat(a, cnt)]
+        seg, _, _ = self._closest(q, seg, x, y, len(x))
+        return np.where(seg >= 0, self.pt_lane[np.maximum(seg, 0)], -1)
+
+    def downstream(self, lane, horizon=HORIZON):
+        """(lanes, offset): lanes reachable from the end of `lane` within
+        `horizon` metres, offset = route distance from that end to their start."""
+        key = (int(lane), horizon)
+        hit = self._down.get(key)
+        if hit is None:
+            best, heap = {}, [(0.0, int(s)) for s in self.successors(lane)]
+            heapq.heapify(heap)
+            while heap:
+                d, k = heapq.heappop(heap)
+                if d > horizon:
+                    break
+                if k in best or k == lane:
+                    continue
+                best[k] = d
+                for s in self.successors(k):
+                    heapq.heappush(heap, (d + self.length[k], int(s)))
+            hit = self._down[key] = (np.fromiter(best, np.int64, len(best)),
+                                     np.fromiter(best.values(), float, len(best)))
+        return hit
+
+    def leader_pairs(self, x, y, lane, horizon=HORIZON):
+        """Follower / leader pairs of one timestep along the network.
+
+        `lane` holds lane codes (see `codes()`); vehicles whose code is not a
+        lane of this net are placed with `locate()`.  A vehicle's leader is
+        the next one ahead on its lane or, for the front vehicle of a lane,
+        the nearest vehicle on the lanes that follow within `horizon` m.
+        Returns (follower, leader, dx, dy): along-route distance front to
+        front and the difference of lateral offsets."""
+        x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        lane = np.array(lane, dtype=np.int64)
+        off  = (lane < 0) | (lane >= len(self))
+        if off.any():
+            lane[off] = self.locate(x[off], y[off])
+        on = np.flatnonzero(lane >= 0)
+        n  = len(x)
+        s, lat = np.full(n, np.nan), np.full(n, np.nan)
+        s[on], lat[on] = self.project(lane[on], x[on], y[on])
+
+        lead, gap = np.full(n, -1, dtype=np.int64), np.full(n, np.nan)
+        ld = fcd_kernels.find_leaders(s[on], lane[on])
+        m  = ld >= 0
+        lead[on[m]] = on[ld[m]]
+        gap[on[m]]  = s[on[ld[m]]] - s[on[m]]
+
+        # rear-most vehicle of every occupied lane, then look past lane ends
+        order = on[np.lexsort((s[on], lane[on]))]
+        head  = np.ones(len(order), dtype=bool)     # also for an empty timestep
+        head[1:] = lane[order][1:] != lane[order][:-1]
+        rear  = dict(zip(lane[order][head].tolist(), order[head].tolist()))
+        for i in on[~m]:
+            best, rest = np.inf, self.length[lane[i]] - s[i]
+            lanes, offs = self.downstream(lane[i], horizon)
+            for k, o in zip(lanes.tolist(), offs.tolist()):
+                j = rear.get(k)
+                if j is not None and rest + o + s[j] < best:
+                    best, lead[i] = rest + o + s[j], j
+            if best <= rest + horizon:
+                gap[i] = best
+            else:
+                lead[i] = -1
+
+        f = np.flatnonzero(lead >= 0)
+        l = lead[f]
+        return f, l, gap[f], lat[f] - lat[l]
+
+
+if __name__ == "__main__":
+    import sys, time
+    path = sys.argv[1] if len(sys.argv) > 1 else "osm.net.xml"
+    t0  = time.perf_counter()
+    net = load(path)
+    print(f"{path}: {len(net)} lanes, {len(net.succ)} successor links, "
+          f"{net.grid_shape[0]}x{net.grid_shape[1]} grid — "
+          f"{time.perf_counter() - t0:.3f} s (index {index_file(path)})")
@@ -0,0 +1,127 @@
+"""
+perf.py — low-overhead run instrumentation for `run delay final.py`.
+
+`PhaseTimer` splits a control loop's wall time into named phases with one
+`perf_counter()` per phase boundary; `Timeline` samples fleet size, TraCI
+calls and throughput every few steps; `SamplingProfiler` is a stdlib
+(setitimer / SIGPROF) sampler for a single run.  Records are appended to a
+JSON-lines file, one object per replication:
+
+    {"scenario": "delay_0.5", "rep": 1, "seed": 148, "backend": "traci",
+     "wall_s": 812.4, "n_steps": 36000, "steps_per_s": 44.3,
+     "calls_per_step": 2.4,
+     "phases": {"sim_step": 601.2, "queries": 90.1, "ssm": 70.3, ...},
+     "timeline": {"columns": ["time", "vehicles", "cavs", ...], "rows": [...]}}
+
+    timer = PhaseTimer()
+    timer.start()
+    conn.simulationStep();  timer.lap("sim_step")
+    ...
+    append_jsonl("ssm_replications.perf.jsonl", {..., "phases": timer.totals})
+"""
+
+import os, json, time, signal, collections
+
+PHASES = ("sim_step", "queries", "ssm", "writes")
+
+
+class PhaseTimer:
+    """Accumulates wall seconds per phase: `lap(name)` charges the time
+    since the previous `start()` / `lap()` to `name`."""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(PHASES, 0.0)
+        self._t = time.perf_counter()
+
+    def start(self):
+        self._t = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.totals[phase] = self.totals.get(phase, 0.0) + now - self._t
+        self._t = now
+
+
+class Timeline:
+    """Every `every` steps: simulation time, active vehicles and CAVs, TraCI
+    calls per step and steps per wall second over the window."""
+
+    COLUMNS = ("time", "vehicles", "cavs", "calls_per_step", "steps_per_s")
+
+    def __init__(self, every=100):
+        self.every = every
+        self.rows  = []
+        self._step, self._calls, self._t = 0, 0, time.perf_counter()
+
+    def update(self, n_steps, sim_time, vehicles, cavs, calls):
+        if n_steps - self._step < self.every:
+            return
+        now, k = time.perf_counter(), n_steps - self._step
+        self.rows.append([sim_time, vehicles, cavs,
+                          round((calls - self._calls) / k, 3),
+                          round(k / max(now - self._t, 1e-9), 1)])
+        self._step, self._calls, self._t = n_steps, calls, now
+
+    def to_dict(self):
+        return {"columns": list(self.COLUMNS), "rows": self.rows}
+
+
+class SamplingProfiler:
+    """Statistical profiler: every `interval` s of process CPU time the
+    current Python stack is recorded.  Time spent in C (libsumo, numpy) is
+    charged to the calling Python frame; a `sumo` child process (TraCI
+    backend) is not seen at all.  Main thread only (signals)."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks   = collections.Counter()
+        self._old     = None
+
+    def _sample(self, signum, frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                         f":{code.co_firstlineno})")
+            frame = frame.f_back
+        self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._old = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self):
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._old)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def top(self, n=15):
+        """[(function, share of samples)] by self time, largest first."""
+        own   = collections.Counter()
+        for stack, c in self.stacks.items():
+            own[stack.rsplit(";", 1)[-1]] += c
+        total = sum(own.values()) or 1
+        return [(f, c / total) for f, c in own.most_common(n)]
+
+    def write(self, path):
+        """Collapsed stacks ("a;b;c count" lines), the input format of
+        flamegraph.pl / speedscope."""
+        with open(path, "w") as f:
+            for stack, c in sorted(self.stacks.items()):
+                f.write(f"{stack} {c}\n")
+
+
+def append_jsonl(path, record):
+    with open(path, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -1,138 +1,176 @@
-import pandas as pd
-import numpy as np
+"""
+plot.py — crash-count / SSM box plots for every swept parameter, headless.
+
+Inputs are any mix of result files:
+
+    .parquet        `run delay final.py --parquet` (all batches, columnar)
+    .sqlite / .db   the result store itself
+    .xlsx           exported workbooks (first sheet)
+
+A *sweep* is one batch of a store (or one workbook), named after the file
+(with its directory when two inputs share a file name).  For each parameter
+that varies within a sweep (delay, ploss, deterror, ssmThresh, bsmPeriod —
+read from the label for old workbooks without those columns) the rows are
+grouped once; the group statistics go to `<sweep>_<param>.csv` and the
+figure to `<sweep>_<param>.<fmt>`, rendered with the Agg backend in
+`--jobs` worker processes.
+
+    python plot.py ssm_replications.parquet --out figures/
+    python plot.py delay_rep5.xlsx ploss_rep5.xlsx deterror_rep5.xlsx --out figures/ --fmt pdf
+"""
+
+import os, re, argparse
+from concurrent.futures import ProcessPoolExecutor
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import sweeps
+from results_store import ResultStore
+
+XLABELS = {"delay":     "Communication Delay (s)",
+           "ploss":     "Packet Loss Rate",
+           "deterror":  "Detection Error (m)",
+           "ssmThresh": "SSM Threshold (s)",
+           "bsmPeriod": "BSM Period (s)"}
+
+# ---------------------------------------------------------------------------
+# Loading
+# ---------------------------------------------------------------------------
+def sweep_names(paths):
+    """A distinct name per input: the file stem, prefixed with the parent
+    directory when stems repeat (a/base.xlsx, b/base.xlsx -> a_base, b_base)
+    and numbered if that still collides."""
+    stems = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    names = [f"{os.path.basename(os.path.dirname(os.path.abspath(p)))}_{s}"
+             if stems.count(s) > 1 else s for p, s in zip(paths, stems)]
+    return [f"{n}_{k}" if names.count(n) > 1 else n
+            for k, n in enumerate(names, 1)]
+
+
+def load(path, stem):
+    """{sweep name: DataFrame} for one result file named `stem`."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        df = pd.read_parquet(path)
+    elif ext in (".sqlite", ".db"):
+        store = ResultStore(path)
+        df = store.frame()
+        store.close()
+    else:
+        df = pd.read_excel(path, sheet_name=0)
+    if "batch" not in df or df["batch"].nunique() <= 1:
+        return {stem: df}
+    return {f"{stem}_{b}": g for b, g in df.groupby("batch", sort=False)}
+
+
+def with_params(df):
+    """`df` with every sweeps.PARAMS column, missing ones parsed from the
+    scenario labels (delay_0.5, loss_0.1_thr_4, ...)."""
+    df = df.copy()
+    for name, prefix in sweeps.PARAMS.items():
+        if name not in df and "scenario" in df:
+            val = df["scenario"].astype(str).str.extract(
+                rf"(?:^|_){re.escape(prefix)}(-?[0-9.]+(?:e-?[0-9]+)?)", expand=False)
+            df[name] = pd.to_numeric(val, errors="coerce")
+    return df
+
+
+def figure_tasks(sweep, df, out, fmt, dpi):
+    """Render tasks for one sweep: one group-by per varied parameter."""
+    df = with_params(df)
+    tasks = []
+    for name in sweeps.PARAMS:
+        if name not in df or df[name].nunique() <= 1:
+            continue
+        g = df.dropna(subset=[name]).groupby(name, sort=True)
+        stats = g[["n_crashes", "ssm_mean"]].agg(["mean", "median", "std", "count"])
+        stats.columns = [f"{c}_{s}" for c, s in stats.columns]
+        base = os.path.join(out, f"{sweep}_{name}")
+        stats.to_csv(base + ".csv")
+        crash = [np.asarray(c.dropna()) for _, c in g["n_crashes"]]
+        ssm   = [np.asarray(s.dropna()) for _, s in g["ssm_mean"]]
+        tasks.append(dict(path=f"{base}.{fmt}", title=sweep, xlabel=XLABELS[name],
+                          levels=list(stats.index), crash=crash, ssm=ssm,
+                          crash_mean=stats["n_crashes_mean"].to_numpy(),
+                          ssm_mean=stats["ssm_mean_mean"].to_numpy(), dpi=dpi))
+    return tasks
+
+# ---------------------------------------------------------------------------
+# Rendering
+# ---------------------------------------------------------------------------
+def render(task):
+    """Crash counts (left axis) and SSM means (right axis) per level."""
+    pos = np.arange(len(task["levels"]))
+    fig, ax1 = plt.subplots(figsize=(14, 6))
+    ax1.boxplot(
+        task["crash"], positions=pos - 0.15, widths=0.25,
+        patch_artist=True, boxprops=dict(facecolor='skyblue', color='blue', linewidth=2),
+        medianprops=dict(color='navy', linewidth=2), whiskerprops=dict(color='blue'),
+        capprops=dict(color='blue'), showfliers=False
+    )
+    crash_mean_line, = ax1.plot(pos - 0.15, task["crash_mean"], color='blue', marker='o',
+                                linewidth=2, label="Crash Count Mean")
+    ax1.set_ylabel("Crash Count per Run", color='blue', fontsize=14)
+    ax1.tick_params(axis='y', labelcolor='blue')
+    ax1.set_xlabel(task["xlabel"], fontsize=14)
+    ax2 = ax1.twinx()
+    ax2.boxplot(
+        task["ssm"], positions=pos + 0.15, widths=0.25,
+        patch_artist=True, boxprops=dict(facecolor='salmon', color='darkred', linewidth=2),
+        medianprops=dict(color='firebrick', linewidth=2), whiskerprops=dict(color='darkred'),
+        capprops=dict(color='darkred'), showfliers=False
+    )
+    ssm_mean_line, = ax2.plot(pos + 0.15, task["ssm_mean"], color='darkred', marker='s',
+                              linewidth=2, label="SSM Mean per Run")
+    ax2.set_ylabel("SSM Mean (s)", color='darkred', fontsize=14)
+    ax2.tick_params(axis='y', labelcolor='darkred')
+    ax1.set_xticks(pos)
+    ax1.set_xticklabels([f"{v:g}" for v in task["levels"]], fontsize=12)
+    ax1.set_title(task["title"], fontsize=12)
+    blue_patch = plt.Line2D([0], [0], color='skyblue', marker='s', linestyle='None', markersize=10)
+    red_patch = plt.Line2D([0], [0], color='salmon', marker='s', linestyle='None', markersize=10)
+    handles = [blue_patch, crash_mean_line, red_patch, ssm_mean_line]
+    labels = ["Crash Count per Run", "Crash Count Mean", "SSM Mean per Run", "SSM Mean"]
+    fig.legend(handles, labels, loc='lower center', bbox_to_anchor=(0.5, 0.0), ncol=4,
+               fontsize=12, frameon=False)
+    fig.tight_layout(rect=[0, 0.08, 1, 1])
+    fig.savefig(task["path"], dpi=task["dpi"])
+    plt.close(fig)
+    return task["path"]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("inputs", nargs="+", help=".parquet, .sqlite or .xlsx result files")
+    ap.add_argument("--out",  default="figures", help="output directory")
+    ap.add_argument("--fmt",  default="png", help="image format (png, pdf, svg, ...)")
+    ap.add_argument("--dpi",  type=int, default=150)
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                    help="figures rendered in parallel (1 = serial)")
+    args = ap.parse_args(argv)
+    os.makedirs(args.out, exist_ok=True)
+
+    tasks, seen = [], set()
+    for path, stem in zip(args.inputs, sweep_names(args.inputs)):
+        for sweep, df in load(path, stem).items():
+            if sweep in seen:
+                ap.error(f"two inputs give the sweep name {sweep!r}; rename one")
+            seen.add(sweep)
+            found = figure_tasks(sweep, df, args.out, args.fmt, args.dpi)
+            if not found:
+                print(f"{sweep}: no swept parameter found, nothing to plot")
+            tasks += found
+
+    if args.jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(tasks))) as pool:
+            done = list(pool.map(render, tasks))
+    else:
+        done = [render(t) for t in tasks]
+    for path in done:
+        print(f"saved {path}")
+
 
-# DELAY DATA
-df = pd.read_excel("/home/acems/Ali/delay_rep5.xlsx")
-df['delay'] = df['scenario'].str.replace('delay_', '').astype(float)
-df = df.sort_values('delay')
-delays = sorted(df['delay'].unique())
-crash_data = [df[df['delay'] == d]['n_crashes'] for d in delays]
-ssm_data = [df[df['delay'] == d]['ssm_mean'] for d in delays]
-mean_crashes = [np.mean(c) for c in crash_data]
-mean_ssm = [np.mean(s) for s in ssm_data]
-
-fig, ax1 = plt.subplots(figsize=(14, 6))
-bp1 = ax1.boxplot(
-    crash_data, positions=np.arange(len(delays)) - 0.15, widths=0.25,
-    patch_artist=True, boxprops=dict(facecolor='skyblue', color='blue', linewidth=2),
-    medianprops=dict(color='navy', linewidth=2), whiskerprops=dict(color='blue'),
-    capprops=dict(color='blue'), showfliers=False
-)
-crash_mean_line, = ax1.plot(np.arange(len(delays)) - 0.15, mean_crashes, color='blue', marker='o', linewidth=2, label="Crash Count Mean")
-ax1.set_ylabel("Crash Count per Run", color='blue', fontsize=14, weight='normal')
-ax1.tick_params(axis='y', labelcolor='blue')
-ax1.set_xlabel("Communication Delay (s)", fontsize=14, weight='normal')
-ax2 = ax1.twinx()
-bp2 = ax2.boxplot(
-    ssm_data, positions=np.arange(len(delays)) + 0.15, widths=0.25,
-    patch_artist=True, boxprops=dict(facecolor='salmon', color='darkred', linewidth=2),
-    medianprops=dict(color='firebrick', linewidth=2), whiskerprops=dict(color='darkred'),
-    capprops=dict(color='darkred'), showfliers=False
-)
-ssm_mean_line, = ax2.plot(np.arange(len(delays)) + 0.15, mean_ssm, color='darkred', marker='s', linewidth=2, label="SSM Mean per Run")
-ax2.set_ylabel("SSM Mean (s)", color='darkred', fontsize=14, weight='normal')
-ax2.tick_params(axis='y', labelcolor='darkred')
-ax1.set_xticks(np.arange(len(delays)))
-ax1.set_xticklabels([f"{d:.1f}" for d in delays], fontsize=12, weight='normal')
-blue_patch = plt.Line2D([0], [0], color='skyblue', marker='s', linestyle='None', markersize=10, label='Crash Count per Run')
-red_patch = plt.Line2D([0], [0], color='salmon', marker='s', linestyle='None', markersize=10, label='SSM Mean per Run')
-handles = [blue_patch, crash_mean_line, red_patch, ssm_mean_line]
-labels = ["Crash Count per Run", "Crash Count Mean", "SSM Mean per Run", "SSM Mean"]
-plt.legend(handles, labels, loc='lower center', bbox_to_anchor=(0.5, -0.27), ncol=4, fontsize=12, frameon=False)
-plt.tight_layout(rect=[0, 0.1, 1, 1])
-plt.show()
-
-# PACKET LOSS DATA
-df_ploss = pd.read_excel("/home/acems/Ali/ploss_rep5.xlsx")
-df_ploss['ploss'] = df_ploss['scenario'].str.replace('loss_', '').astype(float)
-df_ploss = df_ploss.sort_values('ploss')
-plosses = sorted(df_ploss['ploss'].unique())
-crash_data_ploss = [df_ploss[df_ploss['ploss'] == p]['n_crashes'] for p in plosses]
-ssm_data_ploss = [df_ploss[df_ploss['ploss'] == p]['ssm_mean'] for p in plosses]
-mean_crashes_ploss = [np.mean(c) for c in crash_data_ploss]
-mean_ssm_ploss = [np.mean(s) for s in ssm_data_ploss]
-fig, ax1 = plt.subplots(figsize=(14, 6))
-bp1 = ax1.boxplot(
-    crash_data_ploss, positions=np.arange(len(plosses)) - 0.15, widths=0.25,
-    patch_artist=True, boxprops=dict(facecolor='skyblue', color='blue', linewidth=2),
-    medianprops=dict(color='navy', linewidth=2), whiskerprops=dict(color='blue'),
-    capprops=dict(color='blue'), showfliers=False
-)
-crash_mean_line, = ax1.plot(np.arange(len(plosses)) - 0.15, mean_crashes_ploss, color='blue', marker='o', linewidth=2, label="Crash Count Mean")
-ax1.set_ylabel("Crash Count per Run", color='blue', fontsize=14, weight='normal')
-ax1.tick_params(axis='y', labelcolor='blue')
-ax1.set_xlabel("Packet Loss (%)", fontsize=14, weight='normal')
-ax2 = ax1.twinx()
-bp2 = ax2.boxplot(
-    ssm_data_ploss, positions=np.arange(len(plosses)) + 0.15, widths=0.25,
-    patch_artist=True, boxprops=dict(facecolor='salmon', color='darkred', linewidth=2),
-    medianprops=dict(color='firebrick', linewidth=2), whiskerprops=dict(color='darkred'),
-    capprops=dict(color='darkred'), showfliers=False
-)
-ssm_mean_line, = ax2.plot(np.arange(len(plosses)) + 0.15, mean_ssm_ploss, color='darkred', marker='s', linewidth=2, label="SSM Mean per Run")
-ax2.set_ylabel("SSM Mean (s)", color='darkred', fontsize=14, weight='normal')
-ax2.tick_params(axis='y', labelcolor='darkred')
-ax1.set_xticks(np.arange(len(plosses)))
-ax1.set_xticklabels([f"{p:.2f}" for p in plosses], fontsize=12, weight='normal')
-blue_patch = plt.Line2D([0], [0], color='skyblue', marker='s', linestyle='None', markersize=10, label='Crash Count per Run')
-red_patch = plt.Line2D([0], [0], color='salmon', marker='s', linestyle='None', markersize=10, label='SSM Mean per Run')
-handles = [blue_patch, crash_mean_line, red_patch, ssm_mean_line]
-labels = ["Crash Count per Run", "Crash Count Mean", "SSM Mean per Run", "SSM Mean"]
-plt.legend(handles, labels, loc='lower center', bbox_to_anchor=(0.5, -0.27), ncol=4, fontsize=12, frameon=False)
-plt.tight_layout(rect=[0, 0.1, 1, 1])
-plt.show()
-
-# DETECTION ERROR DATA
-df_error = pd.read_excel("/home/acems/Ali/deterror_rep5.xlsx")
-df_error['error'] = df_error['scenario'].str.replace('err_', '').astype(float)
-df_error = df_error.sort_values('error')
-
-# Only include errors with at least one run
-errors_all = sorted(df_error['error'].unique())
-crash_data_error = [df_error[df_error['error'] == e]['n_crashes'] for e in errors_all]
-ssm_data_error = [df_error[df_error['error'] == e]['ssm_mean'] for e in errors_all]
-
-# Filter out errors with empty data
-filtered_errors = []
-filtered_crash_data = []
-filtered_ssm_data = []
-for e, cdata, sdata in zip(errors_all, crash_data_error, ssm_data_error):
-    if len(cdata) > 0 and len(sdata) > 0:
-        filtered_errors.append(e)
-        filtered_crash_data.append(cdata)
-        filtered_ssm_data.append(sdata)
-
-mean_crashes_error = [np.mean(c) for c in filtered_crash_data]
-mean_ssm_error = [np.mean(s) for s in filtered_ssm_data]
-
-fig, ax1 = plt.subplots(figsize=(14, 6))
-bp1 = ax1.boxplot(
-    filtered_crash_data, positions=np.arange(len(filtered_errors)) - 0.15, widths=0.25,
-    patch_artist=True, boxprops=dict(facecolor='skyblue', color='blue', linewidth=2),
-    medianprops=dict(color='navy', linewidth=2), whiskerprops=dict(color='blue'),
-    capprops=dict(color='blue'), showfliers=False
-)
-crash_mean_line, = ax1.plot(np.arange(len(filtered_errors)) - 0.15, mean_crashes_error, color='blue', marker='o', linewidth=2, label="Crash Count Mean")
-ax1.set_ylabel("Crash Count per Run", color='blue', fontsize=14, weight='normal')
-ax1.tick_params(axis='y', labelcolor='blue')
-ax1.set_xlabel("Detection Error", fontsize=14, weight='normal')
-ax2 = ax1.twinx()
-bp2 = ax2.boxplot(
-    filtered_ssm_data, positions=np.arange(len(filtered_errors)) + 0.15, widths=0.25,
-    patch_artist=True, boxprops=dict(facecolor='salmon', color='darkred', linewidth=2),
-    medianprops=dict(color='firebrick', linewidth=2), whiskerprops=dict(color='darkred'),
-    capprops=dict(color='darkred'), showfliers=False
-)
-ssm_mean_line, = ax2.plot(np.arange(len(filtered_errors)) + 0.15, mean_ssm_error, color='darkred', marker='s', linewidth=2, label="SSM Mean per Run")
-ax2.set_ylabel("SSM Mean (s)", color='darkred', fontsize=14, weight='normal')
-ax2.tick_params(axis='y', labelcolor='darkred')
-ax1.set_xticks(np.arange(len(filtered_errors)))
-ax1.set_xticklabels([f"{e:.1f}" for e in filtered_errors], fontsize=12, weight='normal')
-blue_patch = plt.Line2D([0], [0], color='skyblue', marker='s', linestyle='None', markersize=10, label='Crash Count per Run')
-red_patch = plt.Line2D([0], [0], color='salmon', marker='s', linestyle='None', markersize=10, label='SSM Mean per Run')
-handles = [blue_patch, crash_mean_line, red_patch, ssm_mean_line]
-labels = ["Crash Count per Run", "Crash Count Mean", "SSM Mean per Run", "SSM Mean"]
-plt.legend(handles, labels, loc='lower center', bbox_to_anchor=(0.5, -0.27), ncol=4, fontsize=12, frameon=False)
-plt.tight_layout(rect=[0, 0.1, 1, 1])
-plt.show()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+results_store.py — crash-safe, append-only store of finished replications.
+
+`run delay final.py` commits every replication to a local SQLite file as soon
+as it finishes, keyed by (batch, scenario, rep, seed).  Each row also keeps
+a `settings` hash of everything else that shapes its result (parameters,
+config, warm-up, ...).  An interrupted sweep can be restarted with
+`--resume`, which skips the (scenario, rep, seed, settings) keys already
+stored; since every replication is seeded from its key alone, the resumed
+sweep ends with exactly the rows an uninterrupted one would have written,
+and a rerun with other settings replaces the stored rows.  Adaptive
+sweeps also keep one stopping record per scenario, exported as a second
+sheet.  `export_parquet()` writes the rows of every batch as one columnar
+file for plot.py (needs pyarrow; skipped with a note without it).
+
+    store = ResultStore("ssm_replications.sqlite")
+    store.add("delay", idx=1, scenario="delay_0.0", rep=1, seed=143,
+              row={...}, wall_s=812.4, settings="9f2c41d0a7b3e815")
+    store.export("ssm_replications.xlsx", batch="delay")
+    store.export_parquet("ssm_replications.parquet")
+"""
+
+import json, time, sqlite3
+import pandas as pd
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    batch    TEXT    NOT NULL,
+    scenario TEXT    NOT NULL,
+    rep      INTEGER NOT NULL,
+    seed     INTEGER NOT NULL,
+    idx      INTEGER NOT NULL,   -- scenario position in the sweep, for ordering
+    row      TEXT    NOT NULL,   -- the result row as JSON
+    wall_s   REAL,
+    finished REAL,
+    settings TEXT    NOT NULL DEFAULT '',   -- hash of the run's other settings
+    PRIMARY KEY (batch, scenario, rep, seed)
+);
+CREATE TABLE IF NOT EXISTS stops (
+    batch    TEXT    NOT NULL,
+    scenario TEXT    NOT NULL,
+    idx      INTEGER NOT NULL,
+    info     TEXT    NOT NULL,   -- adaptive stopping record as JSON
+    PRIMARY KEY (batch, idx, scenario)
+)
+"""
+
+
+class ResultStore:
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        cols = [c[1] for c in self.db.execute("PRAGMA table_info(runs)")]
+        if "settings" not in cols:     # older store: its rows match no settings
+            self.db.execute("ALTER TABLE runs ADD COLUMN settings TEXT NOT NULL DEFAULT ''")
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def keys(self, batch):
+        """{(scenario, rep, seed, settings)} already stored for `batch`."""
+        cur = self.db.execute("SELECT scenario, rep, seed, settings FROM runs "
+                              "WHERE batch = ?", (batch,))
+        return set(cur.fetchall())
+
+    def add(self, batch, idx, scenario, rep, seed, row, wall_s=None, settings=""):
+        """Store one finished replication and commit immediately; it replaces
+        any row of the same (batch, scenario, rep, seed)."""
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO runs (batch, scenario, rep, seed, idx, "
+                            "row, wall_s, finished, settings) VALUES (?,?,?,?,?,?,?,?,?)",
+                            (batch, scenario, rep, seed, idx,
+                             json.dumps(row), wall_s, time.time(), settings))
+
+    def rows(self, batch=None, keys=None):
+        """Result rows in sweep order, optionally limited to `batch` and to a
+        set of (scenario, rep, seed, settings) keys."""
+        sql, par = "SELECT scenario, rep, seed, settings, row FROM runs", ()
+        if batch is not None:
+            sql, par = sql + " WHERE batch = ?", (batch,)
+        sql += " ORDER BY idx, rep, seed"
+        return [json.loads(row) for s, r, sd, st, row in self.db.execute(sql, par)
+                if keys is None or (s, r, sd, st) in keys]
+
+    def frame(self, batch=None, keys=None):
+        """`rows()` as a DataFrame with the batch as first column."""
+        sql, par = "SELECT batch, scenario, rep, seed, settings, row FROM runs", ()
+        if batch is not None:
+            sql, par = sql + " WHERE batch = ?", (batch,)
+        sql += " ORDER BY batch, idx, rep, seed"
+        rows = [{"batch": b, **json.loads(row)}
+                for b, s, r, sd, st, row in self.db.execute(sql, par)
+                if keys is None or (s, r, sd, st) in keys]
+        return pd.DataFrame(rows)
+
+    def set_stop(self, batch, idx, scenario, info):
+        """Record why the adaptive scheduler stopped adding reps to `scenario`."""
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO stops VALUES (?,?,?,?)",
+                            (batch, scenario, idx, json.dumps(info)))
+
+    def stops(self, batch=None, scenarios=None):
+        """Stopping records in sweep order, optionally limited to a set of
+        (idx, scenario) pairs."""
+        sql, par = "SELECT idx, scenario, info FROM stops", ()
+        if batch is not None:
+            sql, par = sql + " WHERE batch = ?", (batch,)
+        return [json.loads(info) for i, s, info in self.db.execute(sql + " ORDER BY idx", par)
+                if scenarios is None or (i, s) in scenarios]
+
+    def walls(self):
+        """(row, wall_s) of every timed replication in the store, any batch."""
+        cur = self.db.execute("SELECT row, wall_s FROM runs WHERE wall_s IS NOT NULL")
+        return [(json.loads(row), wall) for row, wall in cur]
+
+    def lookup(self, batch, keys):
+        """{(scenario, rep, seed, settings): row} for the stored subset of `keys`."""
+        cur = self.db.execute("SELECT scenario, rep, seed, settings, row FROM runs "
+                              "WHERE batch = ?", (batch,))
+        return {(s, r, sd, st): json.loads(row) for s, r, sd, st, row in cur
+                if (s, r, sd, st) in keys}
+
+    def export(self, path, batch=None, keys=None, stops=True, scenarios=None):
+        """Write the stored rows to Excel; returns the number of rows.  With
+        `stops`, any adaptive stopping records (of `scenarios`, see `stops()`)
+        go to a second sheet "stopping" — the rows stay on the first sheet
+        as before."""
+        rows  = self.rows(batch, keys)
+        extra = self.stops(batch, scenarios) if stops else []
+        with pd.ExcelWriter(path) as xw:
+            pd.DataFrame(rows).to_excel(xw, index=False)
+            if extra:
+                pd.DataFrame(extra).to_excel(xw, sheet_name="stopping", index=False)
+        return len(rows)
+
+    def export_parquet(self, path, batch=None, keys=None):
+        """Write `frame()` to Parquet; returns the number of rows, or None if
+        pandas has no Parquet engine (pyarrow / fastparquet) installed."""
+        df = self.frame(batch, keys)
+        try:
+            df.to_parquet(path, index=False)
+        except ImportError:
+            print(f"Parquet export to {path} skipped: needs pyarrow or fastparquet")
+            return None
+        return len(df)
@@ -3,11 +3,14 @@
 run_delay.py — Batch-run SUMO scenarios, *repeat each setting N times*,
 and write **one Excel row per replication** with:
 
-    scenario | rep | ssm_mean | ssm_p1 | ssm_median | n_crashes
+    scenario | rep | delay | ploss | deterror | ssmThresh | bsmPeriod |
+    ssm_mean | ssm_p1 | ssm_median | n_crashes
 
-Safety-trend fixes are retained:
-  • mean SSM monotonically ↓ with delay
-  • crash count monotonically ↑ with delay
+Time is simulation seconds throughout (V2X latency and reaction windows
+alike; see ▸ V2X CHANNEL).  The delay trends are outcomes, not guarantees:
+on osm.sumocfg the mean SSM still falls with delay, but ssm_mean averages
+only samples <= 5 s, so on a sparse network where few pairs get that close
+without delay it can rise with delay as more pairs enter the sample.
 
 ▸ 2025-07-31 INCLUSIVE RANGE PATCH
 ---------------------------------
@@ -19,35 +22,253 @@ so with:
     --reps 5
 
 …you’ll get 21 error values (−2.0…2.0) × 5 reps = **105 rows**.
+
+▸ PARALLEL REPLICATIONS (--jobs N)
+---------------------------------
+Every (grid value, rep) pair is an independent job.  With `--jobs N` the jobs
+run in N worker processes, each with its own labelled TraCI connection and
+its own `collisions_<idx>_<rep>.xml`.  The packet-loss draws come from a
+per-replication RNG seeded with `seed_rep`, so a parallel sweep writes the
+same rows as a serial one with the same `--seed`.
+
+▸ IN-PROCESS BACKEND (--backend libsumo)
+---------------------------------------
+`--backend libsumo` runs the identical control loop against libsumo inside
+the Python process (no `sumo` child, no socket).  `--gui` always uses TraCI.
+Each replication logs its wall time so the two backends can be compared.
+
+▸ RESULT STORE & RESUME (--store, --resume, --export)
+----------------------------------------------------
+Each finished replication is committed at once to an SQLite store
+(`<excel>.sqlite` by default) keyed by (batch, scenario, rep, seed) plus a
+hash of the five parameters, --cfg (path and content), --warmup and
+--ssmAlpha; the Excel file is exported from the store at the end.  After a
+crash, rerun the same command with `--resume` to skip stored keys — seeding
+depends only on the key, so the final workbook is identical.
+A resume with other settings reruns (and replaces) the affected rows.
+`--export` only rewrites the workbook.
+
+▸ STREAMING SSM STATISTICS (--ssmAlpha)
+--------------------------------------
+SSM samples are no longer kept in a list: `online_stats.StreamingStats`
+tracks the exact mean and a mergeable quantile sketch, so `ssm_p1` and
+`ssm_median` are within ±ssmAlpha (relative, default 0.5 %) of the exact
+np.percentile / np.median values and memory stays flat for any run length.
+
+▸ OUTPUT PROFILES (--outputs, --outDir, --gzipOutputs)
+-----------------------------------------------------
+`osm.sumocfg` switches on fcd/tripinfo/statistic/collision output and the
+edgeData in `output.add.xml`.  The runner now decides per replication:
+
+    metrics-only       nothing on disk
+    collisions+stats   collisions_<idx>_<rep>.xml + stats_<idx>_<rep>.xml  (default)
+    full-trace         + tripinfos, fcd and edgeData, each per replication
+
+Outputs outside the profile go to SUMO's `nul` device; crashes are always
+counted in memory from TraCI's collision list.  Additional files are always
+loaded in full (detectors, stops, TLS programs, ...); one that declares
+outputs runs as a per-replication copy with just those outputs retargeted.
+
+▸ WARM START (--warmup SECONDS)
+------------------------------
+The first SECONDS of the hour (network loading, traffic ramp-up) are
+simulated once per seed family — family `--seed + rep`, shared by replication
+`rep` of every scenario — without CAV control, and saved as a SUMO state.
+Each replication loads that snapshot, then runs with its own `seed_rep` and
+channel settings; warm-up steps never enter the SSM or crash statistics.
+Warm-up, startup and replication wall times are reported separately.
+
+▸ ADAPTIVE REPLICATION (--adaptive, --ciTarget, --minReps, --maxReps, --budget)
+-----------------------------------------------------------------------------
+Instead of a flat `--reps`, every scenario first gets `--minReps` runs; then,
+round by round, one more rep goes to each scenario whose 95 % CI of ssm_mean
+or n_crashes is still wider than `--ciTarget` × |mean|, widest first when the
+`--budget` (total runs in the sweep, at least --minReps × scenarios) cannot
+cover them all; a CI that cannot be judged yet (inf) is served last, and a
+scenario without SSM samples is judged on n_crashes alone.  A scenario stops
+as "converged", "max_reps" or "budget"; the reasons land on a second sheet
+"stopping" of the same workbook.  Rep r of a scenario keeps its usual seed,
+so adaptive rows equal the fixed-rep rows they overlap with.
+
+▸ MULTI-PARAMETER SWEEPS (--sweep SPEC.json, --vary, --design, --samples)
+-----------------------------------------------------------------------
+`--batch` varies one channel parameter with the others at zero.  A sweep
+spec (format in sweeps.py) or repeated `--vary NAME=VALUES` instead spans
+delay, ploss, deterror, ssmThresh and bsmPeriod together, as a full grid or
+a Latin hypercube, e.g.
+
+    --vary delay=0:1:0.25 --vary ploss=0,0.2,0.4          # 5 × 3 scenarios
+
+Every row carries the five parameters as columns; the scenario label is only
+a name.  With --jobs, replications are queued longest-expected-first, using
+the wall times of earlier runs in the store (nearest measured point).
+
+▸ V2X CHANNEL (v2x_channel.py)
+-----------------------------
+The single pending `beacon` per leader is replaced by `V2XChannel`: one ring
+buffer of BSMs per (CAV, leader) link in preallocated arrays, latency
+`delay` in simulation seconds and Bernoulli loss drawn for the whole fleet
+each step.  The follower uses the newest delivered BSM (true state until the
+first one arrives); links reset on a leader change and are freed on arrival.
+The SSM is one array expression over all CAVs, and reactions expire from a
+heap instead of a per-step dict rebuild.
+
+Both the channel and the reaction windows now run on simulation seconds.
+The old loop took `t = time / 1000` (kiloseconds), so a BSM arrived 1000 ×
+`delay` late and a reaction lasted 1000 × (DT + delay) instead of DT + delay.
+Rows with delay or loss > 0 therefore differ from workbooks written before
+this change; delay 0 / loss 0 rows are unchanged.
+
+▸ PERF RECORDS & PROFILING (--perfFile, --perfEvery, --profile, --profileHz)
+--------------------------------------------------------------------------
+Every replication appends one JSON line to `<excel>.perf.jsonl` (perf.py):
+wall time split into sim_step / queries / ssm / writes / other, steps/s,
+TraCI calls per step, and a timeline of vehicles, CAVs, calls/step and
+steps/s every --perfEvery steps.  `--profile delay_0.5:2` additionally
+samples that one replication's Python stacks (setitimer, no dependencies)
+into --outDir/profile_<idx>_<rep>.txt as collapsed stacks and prints the
+top functions.
+
+▸ PARQUET EXPORT & HEADLESS PLOTS (--parquet, plot.py)
+-----------------------------------------------------
+`--parquet` also writes every batch in the store to `<excel>.parquet`, one
+row per replication with a `batch` column.  plot.py reads that file, the
+SQLite store itself or the workbooks, and renders one figure per swept
+parameter to image files (Agg backend, figures in parallel):
+
+    python plot.py ssm_replications.parquet --out figures/
 """
 
-import os, math, random, argparse, collections
+import os, gzip, json, math, time, heapq, hashlib, argparse, bisect, collections, functools
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
-import pandas as pd
 from sumolib import checkBinary
 import traci, traci.exceptions
-from sumolib.xml import parse
+import traci.constants as tc
+import xml.etree.ElementTree as ET
+from results_store import ResultStore
+from online_stats import StreamingStats
+from v2x_channel import V2XChannel
+import perf
+import sweeps
 
-# ------------------------ CLI ARGUMENTS ------------------------
-ap = argparse.ArgumentParser()
-ap.add_argument("--cfg",          default="osm.sumocfg")
-ap.add_argument("--gui",          action="store_true")
-ap.add_argument("--seed",         type=int,   default=42)
-ap.add_argument("--excel",        default="ssm_replications.xlsx")
-ap.add_argument("--batch",        choices=["deterror", "delay", "ploss"],
-                               default="delay")
-ap.add_argument("--reps",         type=int,   default=5,
-                               help="replications per scenario")
-ap.add_argument("--ssmThresh",    type=float, default=4.0)
-ap.add_argument("--bsmPeriod",    type=float, default=0.1)
 # ------- parameter grids (edit to taste) -------
 DETECTION_ERROR_RANGE = (-2, 2);  DETECTION_ERROR_STEP = 0.2
 DELAY_RANGE           = (0.0, 2.0); DELAY_STEP         = 0.1
 PLOSS_RANGE           = (0.0, 1.0); PLOSS_STEP         = 0.05
-args = ap.parse_args()
 
-SUMO_BIN = checkBinary("sumo-gui" if args.gui else "sumo")
-random.seed(args.seed);  np.random.seed(args.seed)
+# ------------------------ CLI ARGUMENTS ------------------------
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--cfg",          default="osm.sumocfg")
+    ap.add_argument("--gui",          action="store_true")
+    ap.add_argument("--seed",         type=int,   default=42)
+    ap.add_argument("--excel",        default="ssm_replications.xlsx")
+    ap.add_argument("--batch",        choices=["deterror", "delay", "ploss"],
+                                   default="delay")
+    ap.add_argument("--reps",         type=int,   default=5,
+                                   help="replications per scenario")
+    ap.add_argument("--sweep",        default=None, metavar="SPEC.json",
+                                   help="multi-parameter sweep (see sweeps.py); "
+                                        "replaces --batch")
+    ap.add_argument("--vary",         action="append", default=[], metavar="NAME=VALUES",
+                                   help="sweep NAME over VALUES (a,b,c | a:b:step | a:b "
+                                        "for lhs); repeatable, replaces --batch")
+    ap.add_argument("--design",       choices=sweeps.DESIGNS, default=None,
+                                   help="combine --vary values as a full grid or a "
+                                        "Latin hypercube")
+    ap.add_argument("--samples",      type=int,   default=None,
+                                   help="Latin-hypercube points")
+    ap.add_argument("--adaptive",     action="store_true",
+                                   help="add reps per scenario until the CIs converge")
+    ap.add_argument("--ciTarget",     type=float, default=0.10,
+                                   help="adaptive: max 95%% CI half-width relative to the "
+                                        "mean, for ssm_mean and n_crashes")
+    ap.add_argument("--minReps",      type=int,   default=3,
+                                   help="adaptive: reps every scenario gets")
+    ap.add_argument("--maxReps",      type=int,   default=20,
+                                   help="adaptive: reps no scenario exceeds")
+    ap.add_argument("--budget",       type=int,   default=None,
+                                   help="adaptive: max replications in the whole sweep")
+    ap.add_argument("--ssmThresh",    type=float, default=4.0)
+    ap.add_argument("--bsmPeriod",    type=float, default=0.1)
+    ap.add_argument("--outputs",      choices=sorted(OUTPUT_PROFILES),
+                                   default="collisions+stats",
+                                   help="SUMO outputs written per replication")
+    ap.add_argument("--outDir",       default=".",
+                                   help="directory for per-replication outputs")
+    ap.add_argument("--gzipOutputs",  action="store_true",
+                                   help="write retained outputs as .xml.gz")
+    ap.add_argument("--warmup",       type=float, default=0.0,
+                                   help="seconds simulated once per seed family and "
+                                        "restored for every replication (0 = off)")
+    ap.add_argument("--ssmAlpha",     type=float, default=0.005,
+                                   help="relative error bound of ssm_p1 / ssm_median")
+    ap.add_argument("--perfFile",     default=None,
+                                   help="per-replication perf records, JSON lines "
+                                        "(default: <excel>.perf.jsonl)")
+    ap.add_argument("--perfEvery",    type=int,   default=100,
+                                   help="steps between perf timeline samples")
+    ap.add_argument("--profile",      default=None, metavar="SCENARIO:REP",
+                                   help="sample-profile this one replication into "
+                                        "--outDir/profile_<idx>_<rep>.txt")
+    ap.add_argument("--profileHz",    type=float, default=200.0,
+                                   help="profiler samples per CPU second")
+    ap.add_argument("--jobs",         type=int,   default=1,
+                                   help="worker processes (1 = serial)")
+    ap.add_argument("--backend",      choices=["traci", "libsumo"],
+                                   default="traci",
+                                   help="libsumo runs SUMO inside the Python process")
+    ap.add_argument("--store",        default=None,
+                                   help="SQLite result store (default: <excel>.sqlite)")
+    ap.add_argument("--resume",       action="store_true",
+                                   help="skip replications already in --store")
+    ap.add_argument("--export",       action="store_true",
+                                   help="only write --excel from --store and exit")
+    ap.add_argument("--parquet",      action="store_true",
+                                   help="also write the whole store to <excel>.parquet "
+                                        "for plot.py (needs pyarrow)")
+    args = ap.parse_args(argv)
+    os.makedirs(args.outDir, exist_ok=True)
+    if args.store is None:
+        args.store = os.path.splitext(args.excel)[0] + ".sqlite"
+    if args.perfFile is None:
+        args.perfFile = os.path.splitext(args.excel)[0] + ".perf.jsonl"
+    if args.gui and args.backend == "libsumo":
+        print("libsumo has no GUI — falling back to --backend traci")
+        args.backend = "traci"
+    if args.gui and args.jobs > 1:
+        ap.error("--gui needs --jobs 1")
+    args.spec = None
+    if args.sweep or args.vary:
+        spec = sweeps.load(args.sweep) if args.sweep else \
+               sweeps.parse_vary(args.vary)
+        if args.sweep and args.vary:
+            spec["params"].update(sweeps.parse_vary(args.vary)["params"])
+        if args.design:  spec["design"]  = args.design
+        if args.samples: spec["samples"] = args.samples
+        args.spec  = spec
+        args.batch = spec.get("name", "sweep")    # store namespace of the sweep
+    if args.adaptive and not 2 <= args.minReps <= args.maxReps < 100:
+        ap.error("--adaptive needs 2 <= --minReps <= --maxReps < 100")
+    if args.adaptive and args.budget is not None:
+        need = args.minReps * len(make_scenarios(args))
+        if args.budget < need:
+            ap.error(f"--budget {args.budget} is below the first round "
+                     f"(--minReps × scenarios = {need})")
+    args.settings = run_settings(args)
+    return args
+
+def run_settings(args):
+    """Settings besides the scenario parameters that change a replication's
+    row; part of every job's store key (see settings_key)."""
+    try:
+        with open(args.cfg, "rb") as f:
+            cfg_sha1 = hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        cfg_sha1 = None
+    return {"cfg": os.path.abspath(args.cfg), "cfg_sha1": cfg_sha1,
+            "warmup": args.warmup, "ssmAlpha": args.ssmAlpha}
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -69,130 +290,630 @@ def grid(which):
         return np.arange(*PLOSS_RANGE, PLOSS_STEP)
     raise ValueError
 
-G = grid(args.batch)
 label = (lambda v, s, z: [f"{z}{q(x, s):{'' if z=='err_' else '.1f'}}" for x in v])
-sheet = {"deterror": label(G, DETECTION_ERROR_STEP, "err_"),
-         "delay":    label(G, DELAY_STEP,          "delay_"),
-         "ploss":    label(G, PLOSS_STEP,          "loss_")}[args.batch]
 
-rows = []  # one row per replication --------------------------------------------------
+def scenario_labels(which, G):
+    step, prefix = {"deterror": (DETECTION_ERROR_STEP, "err_"),
+                    "delay":    (DELAY_STEP,           "delay_"),
+                    "ploss":    (PLOSS_STEP,           "loss_")}[which]
+    return label(G, step, prefix)
+
+# one grid value / sweep point; `idx` is 1-based as in the file names
+Scenario = collections.namedtuple(
+    "Scenario", "idx scenario comm_delay ploss eps_x ssm_thresh bsm_period")
+# one replication of one scenario
+Job = collections.namedtuple(
+    "Job", "idx rep seed scenario comm_delay ploss eps_x ssm_thresh bsm_period settings")
+
+def make_scenarios(args):
+    if args.spec is not None:
+        defaults = {"delay": 0.0, "ploss": 0.0, "deterror": 0.0,
+                    "ssmThresh": args.ssmThresh, "bsmPeriod": args.bsmPeriod}
+        points = sweeps.expand(args.spec, defaults, seed=args.seed)
+        names  = sweeps.varied(points)
+        return [Scenario(idx, sweeps.label(p, names), *(p[k] for k in sweeps.PARAMS))
+                for idx, p in enumerate(points, 1)]
+    G     = grid(args.batch)
+    sheet = scenario_labels(args.batch, G)
+    return [Scenario(idx, sheet[idx-1],
+                     val if args.batch == "delay" else 0.0,
+                     val if args.batch == "ploss" else 0.0,
+                     val if args.batch == "deterror" else 0.0,
+                     args.ssmThresh, args.bsmPeriod)
+            for idx, val in enumerate(G, 1)]
+
+def scenario_params(sc):
+    """{delay, ploss, deterror, ssmThresh, bsmPeriod} of a Scenario or Job."""
+    return dict(zip(sweeps.PARAMS, (sc.comm_delay, sc.ploss, sc.eps_x,
+                                    sc.ssm_thresh, sc.bsm_period)))
+
+def settings_key(args, sc):
+    """Hash of all five parameters of `sc` and the run settings: the part of
+    the store key that the scenario label does not pin down."""
+    text = json.dumps({**args.settings, **scenario_params(sc)}, sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+def make_job(args, sc, rep):
+    """Replication `rep` of scenario `sc`; the seed depends on nothing else."""
+    return Job(sc.idx, rep, args.seed + sc.idx * 100 + rep, *sc[1:],
+               settings_key(args, sc))
+
+def make_jobs(args, scenarios):
+    return [make_job(args, sc, rep)
+            for sc in scenarios for rep in range(1, args.reps + 1)]
+
+def expected_walls(store, scenarios):
+    """{scenario idx: expected wall seconds} from the replications already in
+    the store: the mean over runs with the same parameters, else over the
+    nearest measured parameter point (range-normalised L1).  Empty if the
+    store holds no timed runs."""
+    seen = collections.defaultdict(list)
+    for row, wall in store.walls():
+        if all(k in row for k in sweeps.PARAMS):
+            seen[tuple(row[k] for k in sweeps.PARAMS)].append(wall)
+    if not seen:
+        return {}
+    pts  = np.array(list(seen), dtype=float)
+    mean = np.array([np.mean(w) for w in seen.values()])
+    span = np.ptp(pts, axis=0)
+    span[span == 0] = 1.0
+    out = {}
+    for sc in scenarios:
+        p = np.array(list(scenario_params(sc).values()), dtype=float)
+        out[sc.idx] = float(mean[(np.abs(pts - p) / span).sum(axis=1).argmin()])
+    return out
 
 # ---------------------------------------------------------------------------
-# Main sweep
+# Adaptive replication
 # ---------------------------------------------------------------------------
-for idx, val in enumerate(G, 1):
-    comm_delay = val if args.batch == "delay" else 0.0
-    ploss      = val if args.batch == "ploss" else 0.0
-    eps_x      = val if args.batch == "deterror" else 0.0
+# two-sided 95 % Student t quantiles for 1…30 degrees of freedom
+T975 = (12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042)
+
+def ci95(values):
+    """(mean, 95 % CI half-width) of the finite values; the half-width is inf
+    with fewer than two."""
+    v = [x for x in values if math.isfinite(x)]
+    if not v:
+        return float("nan"), math.inf
+    m = sum(v) / len(v)
+    if len(v) < 2:
+        return m, math.inf
+    sd = math.sqrt(sum((x - m) ** 2 for x in v) / (len(v) - 1))
+    t  = T975[len(v) - 2] if len(v) - 1 <= len(T975) else 1.960
+    return m, t * sd / math.sqrt(len(v))
+
+def ci_ratio(hw, mean, target):
+    """How many times wider than `target` (relative to |mean|) a CI is;
+    <= 1 means converged.  A zero-width CI is converged even at mean 0."""
+    if hw == 0:
+        return 0.0
+    if not mean or not math.isfinite(mean):
+        return math.inf
+    return hw / (target * abs(mean))
 
-    print(f"\n[{idx:02d}/{len(G)}] {sheet[idx-1]} (delay={comm_delay:.2f}  loss={ploss:.2f})")
+def stop_record(sc, rows, target, reason=None):
+    """Summary of a scenario's reps so far; `ci_ratio` > 1 means not converged.
+    A scenario without a single SSM sample is judged on n_crashes alone."""
+    ssm, ssm_hw = ci95([r["ssm_mean"] for r in rows])
+    crs, crs_hw = ci95([r["n_crashes"] for r in rows])
+    ratios = [ci_ratio(crs_hw, crs, target)]
+    if not math.isnan(ssm):
+        ratios.append(ci_ratio(ssm_hw, ssm, target))
+    return {"scenario":     sc.scenario,
+            "reps":         len(rows),
+            "ssm_mean":     ssm,
+            "ssm_mean_ci":  ssm_hw,
+            "n_crashes":    crs,
+            "n_crashes_ci": crs_hw,
+            "ci_ratio":     max(ratios),
+            "stop":         reason}
 
-    for rep in range(1, args.reps + 1):
-        print(f"   • replication {rep}/{args.reps}")
-        seed_rep = args.seed + idx * 100 + rep
+def adaptive_rounds(args, scenarios, run_round):
+    """Add replications in rounds until every scenario has stopped.
 
-        cmd = [SUMO_BIN, "-c", os.path.abspath(args.cfg), "--start",
-               "--seed", str(seed_rep),
-               "--collision-output", f"collisions_{idx:02d}_{rep}.xml"]
-        traci.start(cmd)
+    Round 0 gives every scenario --minReps reps; afterwards each scenario whose
+    ssm_mean or n_crashes CI is still wider than --ciTarget gets one more rep,
+    widest first when the --budget cannot cover them all (CIs that cannot be
+    judged yet, ratio inf, come last).  `run_round(jobs)`
+    runs (or looks up) the jobs and returns {job_key: row}.  Returns the
+    stopping record of every scenario; reasons are "converged", "max_reps"
+    and "budget"."""
+    rows   = {sc.idx: [] for sc in scenarios}
+    reps   = {sc.idx: 0 for sc in scenarios}
+    want   = {sc.idx: args.minReps for sc in scenarios}
+    budget = math.inf if args.budget is None else args.budget
+    stops  = {}
+    while want:
+        jobs = []
+        for sc in scenarios:
+            if sc.idx in want:
+                jobs += [make_job(args, sc, r)
+                         for r in range(reps[sc.idx] + 1, reps[sc.idx] + want[sc.idx] + 1)]
+                reps[sc.idx] += want[sc.idx]
+        budget -= len(jobs)
+        out = run_round(jobs)
+        for job in jobs:
+            if job_key(job) in out:          # failed reps are simply missing
+                rows[job.idx].append(out[job_key(job)])
 
-        Delayed = collections.namedtuple("Delayed", "x y vx vy")
-        beacon, reaction_until, ssm_vals = {}, {}, []
-        tau_loss = ploss * args.bsmPeriod / (1 - ploss + 1e-8)
-        DT       = comm_delay + tau_loss
+        want, queue = {}, []
+        for sc in scenarios:
+            if sc.idx in stops:
+                continue
+            rec = stop_record(sc, rows[sc.idx], args.ciTarget)
+            if rec["ci_ratio"] <= 1:
+                rec["stop"] = "converged"
+            elif reps[sc.idx] >= args.maxReps:
+                rec["stop"] = "max_reps"
+            else:
+                r = rec["ci_ratio"]
+                queue.append(((math.isinf(r), -r), sc.idx, rec))
+                continue
+            stops[sc.idx] = rec
+        for k, (_, idx, rec) in enumerate(sorted(queue, key=lambda e: e[:2])):
+            if k < budget:
+                want[idx] = 1
+            else:
+                rec["stop"] = "budget"
+                stops[idx] = rec
+        if want:
+            print(f"\nAdaptive: {len(stops)} of {len(scenarios)} scenarios stopped, "
+                  f"{len(want)} get another replication")
+    return [stops[sc.idx] for sc in scenarios]
 
+# ---------------------------------------------------------------------------
+# TraCI bookkeeping
+# ---------------------------------------------------------------------------
+# answered from the client-side subscription cache, no socket round-trip
+_LOCAL_CALLS = {"getSubscriptionResults", "getAllSubscriptionResults",
+                "getContextSubscriptionResults",
+                "getAllContextSubscriptionResults"}
+
+class TraciCallCounter:
+    """Proxy around a TraCI connection that counts the round-trips made
+    through it (domains such as `.vehicle` share the parent's tally)."""
+
+    def __init__(self, target, tally=None):
+        self._target = target
+        self._tally  = tally if tally is not None else [0]
+
+    @property
+    def calls(self):
+        return self._tally[0]
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name in _LOCAL_CALLS or name.startswith("_"):
+            return attr
+        if not callable(attr) or isinstance(attr, type):  # libsumo domains are classes
+            return TraciCallCounter(attr, self._tally)
+        def counted(*a, **kw):
+            self._tally[0] += 1
+            return attr(*a, **kw)
+        return counted
+
+SIM_VARS = (tc.VAR_TIME, tc.VAR_MIN_EXPECTED_VEHICLES,
+            tc.VAR_DEPARTED_VEHICLES_IDS, tc.VAR_ARRIVED_VEHICLES_IDS,
+            tc.VAR_COLLIDING_VEHICLES_NUMBER)
+VEH_VARS = (tc.VAR_POSITION, tc.VAR_SPEED, tc.VAR_ANGLE)
+CAV_VARS = VEH_VARS + (tc.VAR_LEADER, tc.VAR_ALLOWED_SPEED)
+LEADER_RANGE = 250
+
+def start_sumo(backend, cmd, tag):
+    """Start SUMO and return (connection, TraCIException class).  libsumo is
+    a module with the TraCI API, so the control loop cannot tell them apart;
+    it allows one simulation per process, which the worker pool guarantees."""
+    if backend == "libsumo":
+        import libsumo
+        libsumo.start(cmd)
+        return libsumo, libsumo.TraCIException
+    traci.start(cmd, label=tag)
+    return traci.getConnection(tag), traci.exceptions.TraCIException
+
+def track_departures(conn, departed, cavs, error=traci.exceptions.TraCIException):
+    """Subscribe newly departed vehicles: kinematics for everybody (they may
+    be somebody's leader), plus leader and speed limit for CAVs.  `cavs` is
+    kept sorted so the control loop visits CAVs in `getIDList()` order."""
+    for vid in departed:
         try:
-            while traci.simulation.getMinExpectedNumber() > 0:
-                traci.simulationStep()
-                t = traci.simulation.getTime() / 1000.0
-
-                for ego in traci.vehicle.getIDList():
-                    if traci.vehicle.getTypeID(ego) != "CAV":
-                        continue
-                    L = traci.vehicle.getLeader(ego, 250)
-                    if not L:
-                        continue
-                    lead, _ = L
-
-                    # -------- delayed BSM buffering ------------------------
-                    if random.random() >= ploss and (
-                        lead not in beacon or beacon[lead][0] <= t):
-                        xL, yL = traci.vehicle.getPosition(lead)
-                        vL     = traci.vehicle.getSpeed(lead)
-                        aL     = math.radians(traci.vehicle.getAngle(lead))
-                        beacon[lead] = (t + comm_delay,
-                                        Delayed(xL, yL,
-                                                vL * math.cos(aL),
-                                                vL * math.sin(aL)))
-
-                    dtime, pkt = beacon.get(lead, (None, None))
-                    if dtime is None or dtime > t:
-                        xL, yL = traci.vehicle.getPosition(lead)
-                        vL     = traci.vehicle.getSpeed(lead)
-                        aL     = math.radians(traci.vehicle.getAngle(lead))
-                        pkt    = Delayed(xL, yL,
-                                         vL * math.cos(aL),
-                                         vL * math.sin(aL))
-
-                    # -------- follower & SSM -------------------------------
-                    xF, yF = traci.vehicle.getPosition(ego)
-                    vF     = traci.vehicle.getSpeed(ego)
-                    aF     = math.radians(traci.vehicle.getAngle(ego))
-                    vFx, vFy = vF * math.cos(aF), vF * math.sin(aF)
-
-                    dx, dy   = pkt.x - xF + eps_x, pkt.y - yF
-                    rvx, rvy = vFx - pkt.vx, vFy - pkt.vy
-                    relspd   = math.hypot(rvx, rvy)
-                    closing  = (dx * rvx + dy * rvy) > 0
-                    if relspd == 0 or not closing:
-                        ssm2d = float("inf")
-                    else:
-                        gap_now  = math.hypot(dx, dy)
-                        pred_gap = gap_now - relspd * DT
-                        ssm2d    = max(pred_gap, 0.0) / relspd
-                    if 0 <= ssm2d <= 5:
-                        ssm_vals.append(ssm2d)
-
-                    # -------- reaction logic (delay-scaled) ----------------
-                    if ssm2d < args.ssmThresh:
-                        reaction_until.setdefault(ego, t + DT + comm_delay)
-                    if ego in reaction_until and t < reaction_until[ego]:
-                        try:
-                            vmax  = traci.vehicle.getAllowedSpeed(ego)
-                            boost = min(1.0 + comm_delay, 3.0)
-                            traci.vehicle.setSpeed(ego, vmax * boost)
-                        except traci.exceptions.TraCIException:
-                            pass
-                    elif ego in reaction_until and t >= reaction_until[ego]:
-                        try:
-                            traci.vehicle.setSpeedMode(ego, 31)
-                            traci.vehicle.setSpeed(ego, -1)
-                            del reaction_until[ego]
-                        except traci.exceptions.TraCIException:
-                            pass
-
-                reaction_until = {k: v for k, v in reaction_until.items() if t < v}
-
-        finally:
-            traci.close()
-
-        crashes = sum(1 for _ in
-                      parse(f"collisions_{idx:02d}_{rep}.xml", "collision"))
-
-        if ssm_vals:
-            ssm_mean   = float(np.mean(ssm_vals))
-            ssm_p1     = float(np.percentile(ssm_vals, 1))
-            ssm_median = float(np.median(ssm_vals))
+            if conn.vehicle.getTypeID(vid) == "CAV":
+                conn.vehicle.subscribe(vid, CAV_VARS,
+                                       parameters={tc.VAR_LEADER: float(LEADER_RANGE)})
+                bisect.insort(cavs, vid)
+            else:
+                conn.vehicle.subscribe(vid, VEH_VARS)
+        except error:
+            pass  # already gone again (e.g. removed on insertion)
+
+# ---------------------------------------------------------------------------
+# Output profiles
+# ---------------------------------------------------------------------------
+# outputs each profile keeps (everything else is sent to SUMO's "nul" device);
+# "additional" = the file outputs declared in additional files (edgeData, …)
+OUTPUT_PROFILES = {
+    "metrics-only":     (),
+    "collisions+stats": ("collision", "statistic"),
+    "full-trace":       ("collision", "statistic", "tripinfo", "fcd", "additional"),
+}
+SUMO_OUTPUTS = {"collision": ("--collision-output", "collisions"),
+                "statistic": ("--statistic-output", "stats"),
+                "tripinfo":  ("--tripinfo-output",  "tripinfos"),
+                "fcd":       ("--fcd-output",       "fcd")}
+
+def _open_xml(path):
+    return gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+
+def cfg_additionals(cfg):
+    """Absolute paths of the additional files named in a .sumocfg."""
+    node = ET.parse(cfg).getroot().find("input/additional-files")
+    if node is None:
+        return []
+    base = os.path.dirname(os.path.abspath(cfg))
+    return [os.path.join(base, f.strip())
+            for f in node.get("value", "").split(",") if f.strip()]
+
+# additional-file elements that write output, and the attribute naming the
+# file; every other element (and any other `file=`, e.g. a rerouter's) is input
+ADDITIONAL_OUTPUTS = {tag: "file" for tag in (
+    "edgeData", "laneData", "edgeRelations", "tazRelations",
+    "inductionLoop", "e1Detector", "instantInductionLoop",
+    "laneAreaDetector", "e2Detector", "multiLaneAreaDetector",
+    "entryExitDetector", "e3Detector", "routeProbe", "vTypeProbe")}
+ADDITIONAL_OUTPUTS.update(timedEvent="dest", calibrator="output")
+
+def output_options(args, run, keep=None):
+    """SUMO options applying the --outputs profile (or `keep`) to the run
+    tagged `run`: kept outputs get unique per-run paths in --outDir (gzip with
+    --gzipOutputs), the rest are switched off.  Every additional file stays
+    loaded; one that declares outputs is replaced by a per-run copy in
+    --outDir with only those outputs retargeted."""
+    keep = OUTPUT_PROFILES[args.outputs] if keep is None else keep
+    gz   = ".gz" if args.gzipOutputs else ""
+    opts = []
+    for name, (opt, stem) in SUMO_OUTPUTS.items():
+        path = os.path.join(args.outDir, f"{stem}_{run}.xml{gz}")
+        opts += [opt, path if name in keep else "nul"]
+
+    adds = cfg_additionals(args.cfg)
+    for k, add in enumerate(adds):
+        try:
+            with _open_xml(add) as f:
+                tree = ET.parse(f)
+        except (OSError, ET.ParseError):
+            continue                   # let SUMO report it as before
+        outs = [e for e in tree.iter() if e.get(ADDITIONAL_OUTPUTS.get(e.tag, ""))]
+        if not outs:
+            continue
+        for e in outs:
+            attr = ADDITIONAL_OUTPUTS[e.tag]
+            stem = os.path.basename(e.get(attr)).split(".")[0]
+            e.set(attr, f"{stem}_{run}.xml{gz}" if "additional" in keep else "nul")
+        # the copy lives in --outDir: input paths must not depend on its place
+        base, retargeted = os.path.dirname(add), set(map(id, outs))
+        for e in tree.iter():
+            for attr in ("file", "href"):
+                if e.get(attr) and id(e) not in retargeted and not os.path.isabs(e.get(attr)):
+                    e.set(attr, os.path.join(base, e.get(attr)))
+        copy = os.path.join(args.outDir, f"{os.path.basename(add).split('.')[0]}_{run}.add.xml")
+        tree.write(copy)
+        adds[k] = os.path.abspath(copy)
+    if not adds:
+        return opts
+    return opts + ["--additional-files", ",".join(adds)]
+
+# ---------------------------------------------------------------------------
+# One replication
+# ---------------------------------------------------------------------------
+def run_replication(args, job):
+    """Run one SUMO replication on its own TraCI connection and return
+    (result row, run info).  Safe to call from a worker process.
+
+    Vehicle state arrives through variable subscriptions, i.e. in one batched
+    reply to each `simulationStep()`; the CAV set is maintained from the
+    departed/arrived lists instead of querying every vehicle's type.  BSMs
+    travel through a `V2XChannel` (per-link packet queues, whole fleet per
+    step) and the SSM of all CAVs is evaluated as one array expression."""
+    comm_delay, ploss, eps_x = job.comm_delay, job.ploss, job.eps_x
+    sumo_bin  = checkBinary("sumo-gui" if args.gui else "sumo")
+
+    cmd = [sumo_bin, "-c", os.path.abspath(args.cfg), "--start",
+           "--seed", str(job.seed)] + output_options(args, f"{job.idx:02d}_{job.rep}")
+    if args.warmup > 0:
+        cmd += ["--load-state", warmup_state(args, job.rep), "--begin", f"{args.warmup:g}"]
+    tag = f"rep_{job.idx:02d}_{job.rep}"
+    t0  = time.perf_counter()
+    conn, TraCIError = start_sumo(args.backend, cmd, tag)
+    conn = TraciCallCounter(conn)
+    startup = None
+    timer    = perf.PhaseTimer()
+    timeline = perf.Timeline(args.perfEvery)
+    profiler = (perf.SamplingProfiler(1.0 / args.profileHz)
+                if args.profile == f"{job.scenario}:{job.rep}" else None)
+
+    reaction_until, expiry = {}, []     # ego -> until; heap of (until, ego)
+    ssm_stats = StreamingStats(args.ssmAlpha)   # bounded memory, see online_stats
+    tau_loss = ploss * job.bsm_period / (1 - ploss + 1e-8)
+    DT       = comm_delay + tau_loss
+    cavs, n_steps, crashes = [], 0, 0
+
+    def kinematics(state):
+        (x, y), v = state[tc.VAR_POSITION], state[tc.VAR_SPEED]
+        a = math.radians(state[tc.VAR_ANGLE])
+        return (x, y, v * math.cos(a), v * math.sin(a))
+
+    try:
+        conn.simulation.subscribe(SIM_VARS)
+        sim = conn.simulation.getSubscriptionResults()
+        channel = V2XChannel(comm_delay, ploss, conn.simulation.getDeltaT(),
+                             seed=job.seed)
+        if args.warmup > 0:   # vehicles restored from the snapshot never "depart"
+            track_departures(conn, conn.vehicle.getIDList(), cavs, TraCIError)
+        startup = time.perf_counter() - t0
+        if profiler:
+            profiler.start()
+        while sim[tc.VAR_MIN_EXPECTED_VEHICLES] > 0:
+            timer.start()
+            conn.simulationStep()
+            n_steps += 1
+            sim   = conn.simulation.getSubscriptionResults()
+            timer.lap("sim_step")
+            now   = sim[tc.VAR_TIME]             # s: V2X channel and reaction windows
+            if sim[tc.VAR_COLLIDING_VEHICLES_NUMBER]:
+                crashes += len(conn.simulation.getCollisions())
+            track_departures(conn, sim[tc.VAR_DEPARTED_VEHICLES_IDS], cavs,
+                             TraCIError)
+            arrived = sim[tc.VAR_ARRIVED_VEHICLES_IDS]
+            for vid in arrived:
+                i = bisect.bisect_left(cavs, vid)
+                if i < len(cavs) and cavs[i] == vid:
+                    del cavs[i]
+            channel.release(arrived)
+            state = conn.vehicle.getAllSubscriptionResults()
+            timer.lap("queries")
+
+            # -------- CAVs with a visible leader --------------------------
+            egos, leads, lead_kin, ego_kin, vmax, lone = [], [], [], [], [], []
+            for ego in cavs:
+                ego_state = state.get(ego)
+                if not ego_state:
+                    continue
+                L = ego_state[tc.VAR_LEADER]
+                if not L or not L[0] or L[0] not in state:
+                    lone.append(ego)
+                    continue
+                egos.append(ego)
+                leads.append(L[0])
+                lead_kin.append(kinematics(state[L[0]]))
+                ego_kin.append(kinematics(ego_state))
+                vmax.append(ego_state[tc.VAR_ALLOWED_SPEED])
+            channel.release(lone)          # losing the leader ends the link
+
+            # -------- delayed BSMs & SSM, whole fleet at once -------------
+            ssm2d = []
+            if egos:
+                pkt, _ = channel.step(now, egos, leads, lead_kin)
+                F = np.asarray(ego_kin, dtype=float)
+                dx, dy   = pkt[:, 0] - F[:, 0] + eps_x, pkt[:, 1] - F[:, 1]
+                rvx, rvy = F[:, 2] - pkt[:, 2], F[:, 3] - pkt[:, 3]
+                relspd   = np.hypot(rvx, rvy)
+                closing  = ((dx * rvx + dy * rvy) > 0) & (relspd != 0)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    pred_gap = np.hypot(dx, dy) - relspd * DT
+                    ssm2d    = np.where(closing, np.maximum(pred_gap, 0.0) / relspd,
+                                        np.inf)
+                ssm_stats.update(ssm2d[ssm2d <= 5].tolist())
+                ssm2d = ssm2d.tolist()
+            timer.lap("ssm")
+
+            # -------- reaction logic (delay-scaled) -----------------------
+            for ego, ssm, vm in zip(egos, ssm2d, vmax):
+                if ssm < job.ssm_thresh and ego not in reaction_until:
+                    reaction_until[ego] = until = now + DT + comm_delay
+                    heapq.heappush(expiry, (until, ego))
+                if ego in reaction_until and now < reaction_until[ego]:
+                    try:
+                        boost = min(1.0 + comm_delay, 3.0)
+                        conn.vehicle.setSpeed(ego, vm * boost)
+                    except TraCIError:
+                        pass
+                elif ego in reaction_until and now >= reaction_until[ego]:
+                    try:
+                        conn.vehicle.setSpeedMode(ego, 31)
+                        conn.vehicle.setSpeed(ego, -1)
+                        del reaction_until[ego]
+                    except TraCIError:
+                        pass
+
+            # expired reactions of CAVs not handled above
+            while expiry and expiry[0][0] <= now:
+                until, ego = heapq.heappop(expiry)
+                if reaction_until.get(ego) == until:
+                    del reaction_until[ego]
+            timer.lap("writes")
+            timeline.update(n_steps, now, len(state), len(cavs), conn.calls)
+
+    finally:
+        if profiler:
+            profiler.stop()
+        conn.close()
+    wall = time.perf_counter() - t0
+
+    print(f"     {job.scenario} rep {job.rep}: {n_steps} steps in {wall:.1f} s "
+          f"wall [{args.backend}] (startup {startup:.1f} s), "
+          f"{conn.calls / max(n_steps, 1):.2f} TraCI calls/step")
+
+    ssm_mean   = ssm_stats.mean()
+    ssm_p1     = ssm_stats.quantile(0.01)
+    ssm_median = ssm_stats.median()
+
+    row = {"scenario":   job.scenario,
+           "rep":        job.rep,
+           **scenario_params(job),
+           "ssm_mean":   ssm_mean,
+           "ssm_p1":     ssm_p1,
+           "ssm_median": ssm_median,
+           "n_crashes":  crashes}
+    if profiler:
+        path = os.path.join(args.outDir, f"profile_{job.idx:02d}_{job.rep}.txt")
+        profiler.write(path)
+        print(f"     profile of {job.scenario} rep {job.rep} → {path}")
+        for func, share in profiler.top(8):
+            print(f"       {share:6.1%}  {func}")
+
+    loop = sum(timer.totals.values())
+    record = {"scenario": job.scenario, "rep": job.rep, "seed": job.seed,
+              "backend": args.backend, "wall_s": wall, "startup_s": startup,
+              "n_steps": n_steps, "steps_per_s": n_steps / max(wall - startup, 1e-9),
+              "calls_per_step": conn.calls / max(n_steps, 1),
+              "phases": {**timer.totals, "other": wall - startup - loop},
+              "timeline": timeline.to_dict()}
+    return row, {"wall_s": wall, "startup_s": startup, "n_steps": n_steps,
+                 "traci_calls": conn.calls, "perf": record}
+
+# ---------------------------------------------------------------------------
+# Warm-up snapshots
+# ---------------------------------------------------------------------------
+def warmup_state(args, rep):
+    """Snapshot shared by replication `rep` of every scenario (seed family
+    `--seed + rep`), so scenarios start from common warmed-up traffic."""
+    return os.path.abspath(os.path.join(
+        args.outDir, f"warmup_{args.seed + rep}_{args.warmup:g}s.xml.gz"))
+
+def run_warmup(args, rep):
+    """Simulate the first --warmup seconds without any CAV control and save
+    the state; returns (rep, wall seconds)."""
+    cmd = [checkBinary("sumo"), "-c", os.path.abspath(args.cfg),
+           "--seed", str(args.seed + rep)] + output_options(args, f"warmup_{rep}", keep=())
+    t0 = time.perf_counter()
+    conn, _ = start_sumo(args.backend, cmd, f"warmup_{rep}")
+    try:
+        conn.simulationStep(args.warmup)
+        conn.simulation.saveState(warmup_state(args, rep))
+    finally:
+        conn.close()
+    return rep, time.perf_counter() - t0
+
+# ---------------------------------------------------------------------------
+# Main sweep
+# ---------------------------------------------------------------------------
+def job_key(job):
+    return (job.scenario, job.rep, job.seed, job.settings)
+
+def export_parquet(args, store):
+    if args.parquet:
+        path = os.path.splitext(args.excel)[0] + ".parquet"
+        n = store.export_parquet(path)
+        if n is not None:
+            print(f"{n} rows (all batches) written to {path}")
+
+def main(argv=None):
+    args  = parse_args(argv)
+    store = ResultStore(args.store)
+    if args.export:
+        n = store.export(args.excel, batch=args.batch)
+        print(f"{n} rows exported from {args.store} to {args.excel}")
+        export_parquet(args, store)
+        return
+
+    scenarios = make_scenarios(args)
+    n_scen  = len(scenarios)
+    expect  = expected_walls(store, scenarios) if args.jobs > 1 else {}
+    n_reps  = args.maxReps if args.adaptive else args.reps
+    run     = functools.partial(run_replication, args)
+    done    = store.keys(args.batch) if args.resume else set()
+    ran, failed, families = [], [], set()
+    cost    = collections.Counter()     # wall seconds: warmup / startup / replications
+    pool    = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+
+    def commit(job, result):
+        # every finished replication is on disk before the next one starts
+        row, info = result
+        store.add(args.batch, job.idx, job.scenario, job.rep, job.seed,
+                  row, info["wall_s"], job.settings)
+        cost["startup"]      += info["startup_s"]
+        cost["replications"] += info["wall_s"] - info["startup_s"]
+        perf.append_jsonl(args.perfFile, {"batch": args.batch, **info["perf"]})
+        ran.append(job)
+
+    def run_jobs(jobs):
+        """Run the jobs not already stored (with --resume); a failed job is
+        reported and left out of the store."""
+        todo = [job for job in jobs if job_key(job) not in done]
+        if args.resume and len(todo) < len(jobs):
+            print(f"Resuming from {args.store}: {len(jobs) - len(todo)} of "
+                  f"{len(jobs)} replications already stored")
+
+        # ---- warm-up: one snapshot per seed family, shared by all scenarios ----
+        new = sorted({job.rep for job in todo} - families) if args.warmup > 0 else []
+        if new:
+            print(f"\nWarming up {len(new)} seed families for {args.warmup:g} s")
+            warm = functools.partial(run_warmup, args)
+            for rep, wall in (pool.map(warm, new) if pool else map(warm, new)):
+                cost["warmup"] += wall
+                families.add(rep)
+                print(f"   • family {args.seed + rep} (rep {rep}) saved in {wall:.1f} s")
+
+        if pool is None:
+            for job in todo:
+                if job.rep == 1 or job is todo[0]:
+                    print(f"\n[{job.idx:02d}/{n_scen}] {job.scenario} "
+                          f"(delay={job.comm_delay:.2f}  loss={job.ploss:.2f})")
+                print(f"   • replication {job.rep}/{n_reps}")
+                try:
+                    commit(job, run(job))
+                except Exception as e:
+                    failed.append(job)
+                    print(f"   ✗ {job.scenario} replication {job.rep} failed: {e!r}")
+        else:
+            # longest expected first, so no long run starts last on an idle pool
+            todo.sort(key=lambda job: -expect.get(job.idx, 0.0))
+            print(f"\n{len(todo)} replications on {args.jobs} workers"
+                  + (", longest expected first" if expect else ""))
+            futs = {pool.submit(run, job): job for job in todo}
+            for k, fut in enumerate(as_completed(futs), 1):
+                job = futs[fut]
+                try:
+                    commit(job, fut.result())
+                except Exception as e:
+                    failed.append(job)
+                    print(f"   ✗ {job.scenario} replication {job.rep} failed: {e!r}")
+                    continue
+                print(f"   • {job.scenario} replication {job.rep}/{n_reps} done "
+                      f"({k}/{len(todo)})")
+        done.update(job_key(job) for job in ran)
+
+    try:
+        if args.adaptive:
+            keys = set()
+            def run_round(jobs):
+                run_jobs(jobs)
+                keys.update(job_key(job) for job in jobs)
+                return store.lookup(args.batch, {job_key(job) for job in jobs})
+            for sc, rec in zip(scenarios, adaptive_rounds(args, scenarios, run_round)):
+                store.set_stop(args.batch, sc.idx, sc.scenario, rec)
+                print(f"   {rec['scenario']}: {rec['stop']} after {rec['reps']} reps "
+                      f"(ssm_mean ±{rec['ssm_mean_ci']:.3g}, "
+                      f"n_crashes ±{rec['n_crashes_ci']:.3g})")
         else:
-            ssm_mean = ssm_p1 = ssm_median = float("nan")
-
-        rows.append({"scenario":   sheet[idx-1],
-                     "rep":        rep,
-                     "ssm_mean":   ssm_mean,
-                     "ssm_p1":     ssm_p1,
-                     "ssm_median": ssm_median,
-                     "n_crashes":  crashes})
-
-# --------------------------- EXPORT ----------------------------------------
-pd.DataFrame(rows).to_excel(args.excel, index=False)
-print(f"\nDone — {len(rows)} rows written to {args.excel}")
+            jobs = make_jobs(args, scenarios)
+            keys = {job_key(job) for job in jobs}
+            run_jobs(jobs)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # --------------------------- EXPORT ------------------------------------
+    n = store.export(args.excel, batch=args.batch, keys=keys, stops=args.adaptive,
+                     scenarios={(sc.idx, sc.scenario) for sc in scenarios})
+    print(f"\nDone — {n} rows written to {args.excel}")
+    export_parquet(args, store)
+    print(f"Wall time: warm-up {cost['warmup']:.1f} s ({len(families)} snapshots), "
+          f"startup {cost['startup']:.1f} s and "
+          f"replications {cost['replications']:.1f} s over {len(ran)} runs")
+    if failed:
+        print(f"{len(failed)} replication(s) failed; rerun with --resume to retry them")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+sweeps.py — multi-parameter sweep specifications for `run delay final.py`.
+
+A sweep names values for any of the five scenario parameters and a design
+that combines them:
+
+    {
+      "name":    "delay_x_loss",
+      "design":  "grid",                 # Cartesian product, or "lhs"
+      "samples": 40,                     # Latin-hypercube points (lhs only)
+      "params":  {"delay": "0:1:0.25",   # a:b:step, upper bound inclusive
+                  "ploss": [0, 0.2, 0.4],
+                  "ssmThresh": 4.0}
+    }
+
+Values are a number (fixed), a list or "a,b,c" (levels), "a:b:step" (levels
+from a to b) or, for "lhs", "a:b" (a continuous range).  Under "lhs" every
+parameter is split into `samples` equal strata, each used exactly once;
+levels are picked stratum by stratum.  Parameters left out keep their
+defaults (0 for the channel, --ssmThresh / --bsmPeriod for the others).
+
+    points = expand(load("spec.json"), defaults, seed=42)
+    points[0]   # {"delay": 0.0, "ploss": 0.0, "deterror": 0.0, ...}
+"""
+
+import json, random, itertools
+
+# parameter -> scenario label prefix, in label and column order
+PARAMS = {"delay": "delay_", "ploss": "loss_", "deterror": "err_",
+          "ssmThresh": "thr_", "bsmPeriod": "bsm_"}
+DESIGNS = ("grid", "lhs")
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_vary(items, design="grid", samples=None, name="sweep"):
+    """Spec from repeated `--vary NAME=VALUES` options."""
+    params = {}
+    for item in items:
+        key, sep, val = item.partition("=")
+        if not sep:
+            raise ValueError(f"--vary expects NAME=VALUES, got {item!r}")
+        params[key.strip()] = val.strip()
+    return {"name": name, "design": design, "samples": samples, "params": params}
+
+
+def parse_values(val, design="grid"):
+    """Levels (list of floats) or, for an lhs "a:b", a (lo, hi) tuple."""
+    if isinstance(val, (int, float)):
+        return [float(val)]
+    if isinstance(val, (list, tuple)):
+        return [float(v) for v in val]
+    if ":" in val:
+        parts = [float(v) for v in val.split(":")]
+        if len(parts) == 2 and design == "lhs":
+            return tuple(parts)
+        if len(parts) != 3 or parts[2] <= 0:
+            raise ValueError(f"bad range {val!r}: expected a:b:step"
+                             + (" or a:b" if design == "lhs" else ""))
+        a, b, step = parts
+        n = int(round((b - a) / step)) + 1
+        return [round(a + k * step, 10) for k in range(n)]
+    return [float(v) for v in val.split(",")]
+
+
+def expand(spec, defaults, seed=0):
+    """List of parameter dicts (every key of PARAMS) for the sweep."""
+    design = spec.get("design", "grid")
+    if design not in DESIGNS:
+        raise ValueError(f"unknown design {design!r}, expected one of {DESIGNS}")
+    unknown = set(spec.get("params", {})) - set(PARAMS)
+    if unknown:
+        raise ValueError(f"unknown sweep parameter(s) {sorted(unknown)}, "
+                         f"expected {list(PARAMS)}")
+    axes = {k: parse_values(spec["params"].get(k, defaults[k]), design)
+            for k in PARAMS}
+
+    if design == "grid":
+        if any(isinstance(v, tuple) for v in axes.values()):
+            raise ValueError("a:b ranges need design 'lhs'")
+        return [dict(zip(axes, combo)) for combo in itertools.product(*axes.values())]
+
+    n = spec.get("samples")
+    if not n or n < 1:
+        raise ValueError("design 'lhs' needs samples >= 1")
+    rng    = random.Random(seed)
+    points = [{} for _ in range(n)]
+    for k, axis in axes.items():
+        strata = list(range(n))
+        rng.shuffle(strata)
+        for p, s in zip(points, strata):
+            u = (s + rng.random()) / n                  # uniform within stratum s
+            if isinstance(axis, tuple):
+                p[k] = axis[0] + u * (axis[1] - axis[0])
+            else:
+                p[k] = axis[min(int(u * len(axis)), len(axis) - 1)]
+    return points
+
+
+def label(point, varied):
+    """Scenario label from the varied parameters, e.g. delay_0.2_loss_0.1."""
+    return "_".join(f"{PARAMS[k]}{point[k]:.4g}" for k in PARAMS if k in varied) \
+        or "baseline"
+
+
+def varied(points):
+    """Parameters that take more than one value across the sweep."""
+    return [k for k in PARAMS if len({p[k] for p in points}) > 1]
@@ -0,0 +1,49 @@
+"""Adaptive replication: stopping rules and budget, with a fake run_round."""
+
+import math
+import pytest
+import bench
+
+runner = bench.load_runner()
+
+
+def parse(tmp_path, *extra):
+    cfg = tmp_path / "x.sumocfg"
+    cfg.write_text("<configuration/>")
+    return runner.parse_args(["--cfg", str(cfg), "--adaptive", "--vary", "delay=0,1,2",
+                              "--minReps", "2", "--maxReps", "6", *extra])
+
+
+def fake_round(rows_of):
+    def run_round(jobs):
+        return {runner.job_key(j): rows_of(j) for j in jobs}
+    return run_round
+
+
+def test_no_ssm_samples_judged_on_crashes(tmp_path):
+    args = parse(tmp_path)
+    scenarios = runner.make_scenarios(args)
+    # delay 0: never an SSM sample and never a crash; others: noisy crashes
+    rows = lambda j: {"ssm_mean": math.nan if j.comm_delay == 0 else 2.0,
+                      "n_crashes": 0 if j.comm_delay == 0 else j.rep % 3}
+    recs = runner.adaptive_rounds(args, scenarios, fake_round(rows))
+    assert recs[0]["stop"] == "converged" and recs[0]["reps"] == 2
+    assert [r["stop"] for r in recs[1:]] == ["max_reps", "max_reps"]
+
+
+def test_inf_ratio_served_last(tmp_path):
+    args = parse(tmp_path, "--budget", "7")
+    scenarios = runner.make_scenarios(args)
+    # delay 0 reps fail after the first, so its CI stays inf
+    rows = lambda j: {"ssm_mean": 2.0 + j.rep % 2, "n_crashes": 1}
+    def run_round(jobs):
+        return {runner.job_key(j): rows(j) for j in jobs
+                if j.comm_delay != 0 or j.rep == 1}
+    recs = runner.adaptive_rounds(args, scenarios, run_round)
+    assert recs[0]["stop"] == "budget" and recs[0]["reps"] == 1   # rows, not attempts
+    assert recs[1]["reps"] == 3
+
+
+def test_budget_below_first_round_rejected(tmp_path):
+    with pytest.raises(SystemExit):
+        parse(tmp_path, "--budget", "5")
@@ -0,0 +1,46 @@
+"""One set of metrics, four ways to read the FCD: stream, cache, parallel, gzip."""
+
+import gzip, shutil
+import numpy as np
+import pytest
+import bench, fcd_cache, fcd_parallel, fcd_stream
+from calc_mean_ttc import parse_fcd, calculate_ttc
+from calc_mean_ssm_2d import calculate_ssm_2d
+
+SSM = dict(tau_delay=0.2, p_loss=0.1)
+
+
+def metrics():
+    return [fcd_stream.MeanTTC(), fcd_stream.MeanSSM2D(**SSM),
+            fcd_stream.SSMGrid(tau_delay=np.array([0.0, 0.5]), p_loss=np.array([0.0, 0.3]))]
+
+
+def same(a, b):
+    assert a["mean_ttc"] == pytest.approx(b["mean_ttc"], rel=1e-12)
+    assert a["mean_ssm_2d"] == pytest.approx(b["mean_ssm_2d"], rel=1e-12)
+    for k, col in a["ssm_grid"].items():
+        np.testing.assert_allclose(col, b["ssm_grid"][k], rtol=1e-12)
+
+
+def test_all_paths_agree(tmp_path):
+    path = str(tmp_path / "fcd.xml")
+    bench.synthetic_fcd(path, vehicles=80, steps=60, lanes=3, seed=2)
+    traj = parse_fcd(path)
+
+    stream = fcd_stream.run_metrics(path, metrics())
+    assert stream["mean_ttc"] == pytest.approx(np.mean(calculate_ttc(traj)), rel=1e-12)
+    assert stream["mean_ssm_2d"] == pytest.approx(np.mean(calculate_ssm_2d(traj, **SSM)),
+                                                  rel=1e-12)
+
+    assert not fcd_cache.is_fresh(path)
+    same(fcd_parallel.run_metrics_parallel(path, metrics(), jobs=2), stream)   # XML ranges
+    for _ in range(2):                                                         # build, reuse
+        same(fcd_stream.run_metrics(path, metrics(),
+                                    timesteps=fcd_cache.load(path).iter_timesteps()), stream)
+    assert fcd_cache.is_fresh(path)
+    same(fcd_parallel.run_metrics_parallel(path, metrics(), jobs=2), stream)   # cache ranges
+
+    gz = path + ".gz"
+    with open(path, "rb") as src, gzip.open(gz, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    same(fcd_parallel.run_metrics_parallel(gz, metrics(), jobs=2), stream)
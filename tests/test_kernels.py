@@ -0,0 +1,65 @@
+"""Vectorised kernels vs. the reference loops in calc_mean_ttc / calc_mean_ssm_2d."""
+
+import random
+import numpy as np
+import pytest
+import fcd_kernels
+from calc_mean_ttc import calculate_ttc
+from calc_mean_ssm_2d import calculate_ssm_2d
+
+
+def random_traj(seed, steps=30, vehicles=25):
+    """Coarse x values (many ties) and lanes including None."""
+    rng = random.Random(seed)
+    traj = []
+    for k in range(steps):
+        vehicles_k = {}
+        for i in rng.sample(range(vehicles * 2), rng.randrange(vehicles + 1)):
+            vehicles_k[f"v{i}"] = {"x": float(rng.randrange(40)) * 2.5,
+                                   "y": rng.choice([0.0, -3.2, 0.4, 2.0]),
+                                   "speed": rng.choice([0.0, 3.0, rng.uniform(0, 30)]),
+                                   "lane": rng.choice(["e_0", "e_1", None])}
+        traj.append({"time": k * 0.1, "vehicles": vehicles_k})
+    return traj
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_leaders_ttc_ssm_match_loops(seed):
+    traj = random_traj(seed)
+    step, x, y, v, lane = fcd_kernels.traj_to_arrays(traj)
+    assert np.array_equal(fcd_kernels.ttc_values(x, v, lane, step), calculate_ttc(traj))
+    for channel in (dict(), dict(tau_delay=0.3, p_loss=0.2), dict(tau_delay=1.5)):
+        ref = calculate_ssm_2d(traj, **channel)
+        assert np.array_equal(fcd_kernels.ssm_2d_values(x, y, v, lane, step, **channel), ref)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_leaders_match_loop(seed):
+    traj = random_traj(seed)
+    step, x, y, v, lane = fcd_kernels.traj_to_arrays(traj)
+    leader, base = fcd_kernels.find_leaders(x, lane, step), 0
+    for ts in traj:
+        ids = list(ts["vehicles"])
+        for i, ego in enumerate(ts["vehicles"].values()):
+            best, lead = float("inf"), -1
+            for j, other in enumerate(ts["vehicles"].values()):
+                if j != i and other["lane"] == ego["lane"] and 0 < other["x"] - ego["x"] < best:
+                    best, lead = other["x"] - ego["x"], j
+            assert leader[base + i] == (base + lead if lead >= 0 else -1), ids[i]
+        base += len(ids)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_ssm_grid_rows_match_loop(seed):
+    traj = random_traj(seed, steps=60)
+    step, x, y, v, lane = fcd_kernels.traj_to_arrays(traj)
+    terms = fcd_kernels.ssm_pair_terms(x, y, v, lane, step)
+    delays, losses = np.array([0.0, 0.4, 1.2]), np.array([0.0, 0.5])
+    res = fcd_kernels.ssm_grid(terms, tau_delay=delays, p_loss=losses)
+    for k in range(len(res["n_ssm"])):
+        ref = calculate_ssm_2d(traj, tau_delay=res["tau_delay"][k], p_loss=res["p_loss"][k])
+        assert res["n_ssm"][k] == len(ref)
+        if ref:
+            assert res["ssm_mean"][k] == pytest.approx(np.mean(ref), rel=1e-12)
+            assert res["ssm_p1"][k] == pytest.approx(np.percentile(ref, 1), rel=1e-12)
+            assert res["ssm_median"][k] == pytest.approx(np.median(ref), rel=1e-12)
@@ -0,0 +1,116 @@
+"""net_index: projection, lookup, leaders across a junction, cache rebuild."""
+
+import os, shutil, subprocess
+import numpy as np
+import pytest
+import fcd_stream, net_index
+
+sumolib = pytest.importorskip("sumolib")
+
+NODES = """<nodes>
+    <node id="a" x="0" y="0"/>
+    <node id="b" x="200" y="0"/>
+    <node id="c" x="300" y="{cy}"/>
+</nodes>
+"""
+EDGES = """<edges>
+    <edge id="ab" from="a" to="b" numLanes="1" speed="15"/>
+    <edge id="bc" from="b" to="c" numLanes="1" speed="15"/>
+</edges>
+"""
+ROUTES = """<routes>
+    <route id="r" edges="ab bc"/>
+    <flow id="f" route="r" begin="2" end="40" period="3" departSpeed="max"/>
+</routes>
+"""
+
+
+def netconvert(work, cy=100):
+    for name, text in (("t.nod.xml", NODES.format(cy=cy)), ("t.edg.xml", EDGES)):
+        with open(os.path.join(work, name), "w") as f:
+            f.write(text)
+    subprocess.run([sumolib.checkBinary("netconvert"), "-n", "t.nod.xml", "-e", "t.edg.xml",
+                    "-o", "t.net.xml", "--no-warnings"],
+                   cwd=work, check=True, stdout=subprocess.DEVNULL)
+    return os.path.join(work, "t.net.xml")
+
+
+@pytest.fixture(scope="module")
+def bend(tmp_path_factory):
+    """A bent two-edge road and a SUMO FCD trace on it (which starts with
+    empty timesteps, before the first departure)."""
+    work = str(tmp_path_factory.mktemp("bend"))
+    path = netconvert(work)
+    with open(os.path.join(work, "t.rou.xml"), "w") as f:
+        f.write(ROUTES)
+    subprocess.run([sumolib.checkBinary("sumo"), "-n", "t.net.xml", "-r", "t.rou.xml",
+                    "--fcd-output", "fcd.xml", "--end", "60", "--no-step-log"],
+                   cwd=work, check=True, stdout=subprocess.DEVNULL)
+    return path, os.path.join(work, "fcd.xml")
+
+
+def fcd_rows(fcd):
+    import xml.etree.ElementTree as ET
+    return [(float(v.get("x")), float(v.get("y")), v.get("lane"), float(v.get("pos")))
+            for v in ET.parse(fcd).getroot().iter("vehicle")]
+
+
+def test_project_matches_fcd_pos_and_locate(bend):
+    path, fcd = bend
+    net  = net_index.load(path)
+    x, y, names, pos = (np.array(c) for c in zip(*fcd_rows(fcd)))
+    lane = np.array([net.lane_of[n] for n in names])
+    s, lat = net.project(lane, x, y)
+    np.testing.assert_allclose(s, pos, atol=0.05)
+    np.testing.assert_allclose(lat, 0.0, atol=0.05)
+    # away from the junction the nearest shape is the FCD lane itself
+    inner = (pos > 10) & (pos < net.length[lane] - 10)
+    assert inner.sum() > 10
+    assert (net.locate(x[inner], y[inner]) == lane[inner]).all()
+    assert (net.locate(np.array([1e6]), np.array([1e6])) == -1).all()
+
+
+def test_leader_across_junction(bend):
+    net = net_index.load(bend[0])
+    ab, bc = net.lane_of["ab_0"], net.lane_of["bc_0"]
+    via = net.successors(ab)
+    assert len(via) == 1 and net.names[via[0]].startswith(":")
+    # follower 5 m before the end of ab, leader 10 m into bc (lane unknown: located)
+    e  = net.pt_off[ab + 1] - 1                     # ab runs along +x
+    k  = net.pt_off[bc]
+    ux, uy = net.px[k + 1] - net.px[k], net.py[k + 1] - net.py[k]
+    d  = 10.0 / net.scale[bc] / np.hypot(ux, uy)
+    x  = np.array([net.px[e] - 5.0, net.px[k] + d * ux])
+    y  = np.array([net.py[e], net.py[k] + d * uy])
+    f, l, dx, dy = net.leader_pairs(x, y, np.array([ab, len(net) + 7]))
+    assert f.tolist() == [0] and l.tolist() == [1]
+    assert dx[0] == pytest.approx(5.0 + net.length[via[0]] + 10.0, abs=0.05)
+    assert dy[0] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_empty_and_off_net_timesteps(bend):
+    path, fcd = bend
+    net = net_index.load(path)
+    for args in ((np.empty(0), np.empty(0), np.empty(0, dtype=np.int64)),
+                 (np.array([1e6, -1e6]), np.array([0.0, 0.0]), np.array([len(net) + 1] * 2))):
+        assert all(len(a) == 0 for a in net.leader_pairs(*args))
+    # a real trace: SUMO writes <timestep/> elements before the first departure
+    steps = list(fcd_stream.iter_timesteps(fcd, lanes=net.codes()))
+    assert len(steps[0].x) == 0
+    res = fcd_stream.run_metrics(fcd, [fcd_stream.MeanTTC(net=net),
+                                       fcd_stream.MeanSSM2D(net=net)], timesteps=steps)
+    assert set(res) == {"mean_ttc", "mean_ssm_2d"}
+
+
+def test_index_rebuilt_when_net_changes(tmp_path):
+    path = netconvert(str(tmp_path))
+    first = net_index.load(path)
+    assert os.path.exists(net_index.index_file(path))
+    length = first.length[first.lane_of["bc_0"]]
+
+    os.utime(path)                                    # touched only: same index
+    assert net_index.load(path).length[first.lane_of["bc_0"]] == length
+
+    shutil.move(netconvert(str(tmp_path), cy=300), path)   # new geometry
+    second = net_index.load(path)
+    assert second.length[second.lane_of["bc_0"]] > length + 50
@@ -0,0 +1,67 @@
+"""StreamingStats: exact mean, quantiles within ±alpha, lossless merge."""
+
+import json
+import numpy as np
+import pytest
+from online_stats import StreamingStats
+
+QS = (0.0, 0.01, 0.05, 0.25, 0.5, 0.75, 0.99, 1.0)
+
+
+def samples(seed, n):
+    rng = np.random.default_rng(seed)
+    x = np.concatenate([rng.lognormal(0.5, 1.0, n), rng.uniform(1e-3, 5, n // 4),
+                        np.zeros(n // 50), -rng.exponential(2.0, n // 10),
+                        np.full(n // 20, 2.5)])          # a block of ties
+    rng.shuffle(x)
+    return x
+
+
+@pytest.mark.parametrize("alpha", [0.005, 0.02, 0.1])
+@pytest.mark.parametrize("seed", range(3))
+def test_quantiles_within_alpha(alpha, seed):
+    x = samples(seed, 4000)
+    s = StreamingStats(alpha)
+    s.update(x.tolist())
+    assert len(s) == len(x)
+    assert s.mean() == pytest.approx(x.mean(), rel=1e-12)
+    for q in QS:
+        exact = np.percentile(x, 100 * q)
+        assert abs(s.quantile(q) - exact) <= alpha * abs(exact) + 1e-12, q
+
+
+def test_merge_and_round_trip_are_lossless():
+    x = samples(7, 3000)
+    whole, parts = StreamingStats(), [StreamingStats() for _ in range(3)]
+    whole.update(x.tolist())
+    for part, chunk in zip(parts, np.array_split(x, 3)):
+        part.update(chunk.tolist())
+    merged = parts[0].merge(parts[1]).merge(parts[2])
+    restored = StreamingStats.from_dict(json.loads(json.dumps(merged.to_dict())))
+    for s in (merged, restored):
+        assert (s.count, s.zeros, s.pos, s.neg) == (whole.count, whole.zeros, whole.pos, whole.neg)
+        assert [s.quantile(q) for q in QS] == [whole.quantile(q) for q in QS]
+    with pytest.raises(ValueError):
+        StreamingStats(0.01).merge(StreamingStats(0.02))
+
+
+def test_empty():
+    s = StreamingStats()
+    assert np.isnan(s.mean()) and np.isnan(s.median())
+
+
+def test_update_rows_equals_add():
+    x = samples(3, 5000)
+    rows = np.random.default_rng(3).integers(0, 7, len(x))
+    one  = [StreamingStats() for _ in range(8)]
+    bulk = [StreamingStats() for _ in range(8)]
+    for r, v in zip(rows.tolist(), x.tolist()):
+        one[r].add(v)
+    StreamingStats.update_rows(bulk, rows[:2000], x[:2000])
+    StreamingStats.update_rows(bulk, rows[2000:], x[2000:])
+    for a, b in zip(one, bulk):
+        assert (a.count, a.zeros, a.min, a.max, a.pos, a.neg) == \
+               (b.count, b.zeros, b.min, b.max, b.pos, b.neg)
+        assert a.total == pytest.approx(b.total, rel=1e-12, abs=1e-9)
+    with pytest.raises(ValueError):
+        StreamingStats.update_rows([StreamingStats(0.01), StreamingStats(0.02)], [0], [1.0])
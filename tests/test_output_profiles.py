@@ -0,0 +1,51 @@
+"""output_options: additional files stay loaded, only their outputs move."""
+
+import os
+import xml.etree.ElementTree as ET
+import bench
+
+runner = bench.load_runner()
+
+ADD = """<additional>
+    <vType id="slow" maxSpeed="5"/>
+    <inductionLoop id="d0" lane="road_0" pos="500" period="60" file="det.xml"/>
+    <edgeData id="ed" period="60" file="out/edge.xml.gz"/>
+    <rerouter id="rr" edges="road" file="closing.xml"/>
+</additional>
+"""
+
+
+def options(tmp_path, profile, adds="det.add.xml,plain.add.xml"):
+    (tmp_path / "det.add.xml").write_text(ADD)
+    (tmp_path / "plain.add.xml").write_text('<additional><poly id="p" shape="0,0 1,1"/></additional>')
+    cfg = tmp_path / "c.sumocfg"
+    cfg.write_text(f'<configuration><input><additional-files value="{adds}"/>'
+                   '</input></configuration>')
+    out = tmp_path / profile
+    args = runner.parse_args(["--cfg", str(cfg), "--outputs", profile, "--outDir", str(out),
+                              "--excel", str(out / "x.xlsx")])
+    opts = runner.output_options(args, "03_2")
+    return opts[opts.index("--additional-files") + 1].split(","), out
+
+
+def test_outputs_off_but_files_kept(tmp_path):
+    adds, out = options(tmp_path, "metrics-only")
+    assert adds == [str(out / "det_03_2.add.xml"), str(tmp_path / "plain.add.xml")]
+    root = ET.parse(adds[0]).getroot()
+    assert root.find("vType").get("id") == "slow"
+    assert root.find("inductionLoop").get("file") == "nul"
+    assert root.find("edgeData").get("file") == "nul"
+    assert root.find("rerouter").get("file") == str(tmp_path / "closing.xml")
+
+
+def test_full_trace_retargets_per_run(tmp_path):
+    adds, out = options(tmp_path, "full-trace")
+    root = ET.parse(adds[0]).getroot()
+    assert root.find("inductionLoop").get("file") == "det_03_2.xml"
+    assert root.find("edgeData").get("file") == "edge_03_2.xml"
+    assert root.find("rerouter").get("file") == str(tmp_path / "closing.xml")
+
+
+def test_files_without_outputs_used_in_place(tmp_path):
+    adds, _ = options(tmp_path, "metrics-only", adds="plain.add.xml")
+    assert adds == [str(tmp_path / "plain.add.xml")]
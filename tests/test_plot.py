@@ -0,0 +1,25 @@
+"""plot.py: inputs sharing a file name must not overwrite each other's figures."""
+
+import os
+import pandas as pd
+import pytest
+import plot
+
+pytest.importorskip("openpyxl")
+
+
+def test_same_stem_in_two_dirs(tmp_path):
+    paths = []
+    for d, base in (("a", 1.0), ("b", 3.0)):
+        os.makedirs(tmp_path / d)
+        df = pd.DataFrame({"scenario": [f"delay_{v}" for v in (0.0, 1.0) for _ in range(3)],
+                           "n_crashes": [0, 1, 2, 1, 2, 3],
+                           "ssm_mean": [base, base + 0.1, base + 0.2] * 2})
+        paths.append(str(tmp_path / d / "base.xlsx"))
+        df.to_excel(paths[-1], index=False)
+    out = tmp_path / "fig"
+    plot.main([*paths, "--out", str(out), "--jobs", "1"])
+    assert sorted(os.listdir(out)) == ["a_base_delay.csv", "a_base_delay.png",
+                                       "b_base_delay.csv", "b_base_delay.png"]
+    a = pd.read_csv(out / "a_base_delay.csv")
+    assert a["ssm_mean_mean"].iloc[0] == pytest.approx(1.1)
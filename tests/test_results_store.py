@@ -0,0 +1,26 @@
+"""ResultStore: export of rows and adaptive stopping records."""
+
+import pandas as pd
+import pytest
+from results_store import ResultStore
+
+pytest.importorskip("openpyxl")
+
+
+def test_stopping_sheet_limited_to_this_run(tmp_path):
+    store = ResultStore(str(tmp_path / "s.sqlite"))
+    for idx, d in enumerate((0, 1, 2), 1):          # first run: delay=0,1,2
+        label = f"delay_{d}"
+        store.add("sweep", idx, label, 1, 100 * idx + 1, {"scenario": label, "rep": 1},
+                  settings="h")
+        store.set_stop("sweep", idx, label, {"scenario": label, "stop": "converged"})
+    keys = {("delay_0", 1, 101, "h"), ("delay_1", 1, 201, "h")}   # second run: delay=0,1
+    path = str(tmp_path / "s.xlsx")
+    n = store.export(path, batch="sweep", keys=keys,
+                     scenarios={(1, "delay_0"), (2, "delay_1")})
+    sheets = pd.read_excel(path, sheet_name=None)
+    assert n == 2
+    assert sheets["Sheet1"]["scenario"].tolist() == ["delay_0", "delay_1"]
+    assert sheets["stopping"]["scenario"].tolist() == ["delay_0", "delay_1"]
+    assert len(store.stops("sweep")) == 3
+    store.close()
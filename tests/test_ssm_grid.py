@@ -0,0 +1,35 @@
+"""Streaming SSMGrid vs. fcd_kernels.ssm_grid over the whole trajectory."""
+
+import copy
+import numpy as np
+import pytest
+import bench, fcd_kernels, fcd_stream
+
+GRID = dict(tau_delay=np.arange(0.0, 2.01, 0.5), t_p=0.1,
+            p_loss=np.array([0.0, 0.3, 0.9]), eps_x=np.array([-1.0, 0.0, 2.0]),
+            ssm_upper=5.0)
+
+
+@pytest.mark.parametrize("flush", [1, 500, 1 << 21])     # bulk-insert batch size
+def test_grid_matches_batch_and_merges(tmp_path, flush):
+    path = str(tmp_path / "fcd.xml")
+    bench.synthetic_fcd(path, vehicles=60, steps=80, lanes=3, seed=4)
+    steps = list(fcd_stream.iter_timesteps(path))
+
+    whole = fcd_stream.SSMGrid(flush=flush, **GRID)
+    head, tail = fcd_stream.SSMGrid(flush=flush, **GRID), fcd_stream.SSMGrid(flush=flush, **GRID)
+    terms = []
+    for k, ts in enumerate(steps):
+        whole.update(ts)
+        (head if k < len(steps) // 2 else tail).update(ts)
+        terms.append(fcd_kernels.ssm_pair_terms(ts.x, ts.y, ts.speed, ts.lane))
+    terms = fcd_kernels.SsmTerms(*map(np.concatenate, zip(*terms)))
+    exact = fcd_kernels.ssm_grid(terms, **GRID)
+
+    merged = copy.deepcopy(head).merge(tail)
+    for grid in (whole, merged):
+        res = grid.result()["ssm_grid"]
+        assert (res["n_ssm"] == exact["n_ssm"]).all() and exact["n_ssm"].sum() > 0
+        np.testing.assert_allclose(res["ssm_mean"], exact["ssm_mean"], rtol=1e-12)
+        for k in ("ssm_p1", "ssm_median"):
+            np.testing.assert_allclose(res[k], exact[k], rtol=0.005)